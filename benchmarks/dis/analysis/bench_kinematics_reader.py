@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+#compare the bytes read and wall time of the InclusiveKinematics readers of kinematics_correlations.py:
+#one uproot call per collection reading every sub-branch (previous reader) vs one call with only the Q2 and x leaves
+
+import os
+import sys
+import time
+import argparse
+import uproot as ur
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from kinematics_correlations import method_collection_dict, read_kinematics
+
+
+
+#previous reader: every sub-branch of each of the Truth, Electron, DA and JB collections, one call per collection
+def read_per_collection(rec_file):
+    nbytes = 0
+    for collection in list(method_collection_dict.values())[:4]:
+        with ur.open(rec_file) as f:
+            f['events'].arrays(filter_name=collection + '.*')
+            nbytes += f.file.source.num_requested_bytes
+    return nbytes
+
+
+
+#single reader of kinematics_correlations.py
+def read_leaves(rec_file):
+    with ur.open(rec_file) as f:
+        read_kinematics(f['events'])
+        return f.file.source.num_requested_bytes
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('rec_file', type=str, help='Reconstructed track file.')
+    parser.add_argument('-r', dest='repeat', type=int, default=3, help='Number of repetitions, the best wall time is reported.')
+    args = parser.parse_args()
+
+    print('{:<16s} {:>10s} {:>12s}'.format('reader', 'time (s)', 'read (MB)'))
+    results = []
+    for name, reader in [('per-collection', read_per_collection), ('Q2/x leaves', read_leaves)]:
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            nbytes = reader(args.rec_file)
+            times.append(time.perf_counter() - t0)
+        results.append((min(times), nbytes))
+        print('{:<16s} {:>10.3f} {:>12.2f}'.format(name, min(times), nbytes/1024./1024.))
+    print('speedup {:.2f}, bytes read ratio {:.3f}'.format(results[0][0]/results[1][0], results[1][1]/results[0][1]))
@@ -2,80 +2,189 @@
 # coding: utf-8
 
 import os
+import sys
+import glob
+import multiprocessing
 import numpy as np
-import uproot as ur
-import awkward as ak
-import matplotlib.pyplot as plt
-import matplotlib as mpl
-import mplhep 
 import argparse
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../scripts'))
+from ntuple_cache import NtupleCache, parse_size, DEFAULT_MAX_BYTES
+#uproot, awkward, matplotlib and mplhep are imported where they are used, so that --help and merge --partial-out start fast
 
 
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--rec_file', type=str, help='Reconstructed track file.')
-parser.add_argument('--ebeam', type=float, help='Electron beam energy.')
-parser.add_argument('--pbeam', type=float, help='Proton (or ion) beam energy.')
-parser.add_argument('--minq2', type=float, help='Minimum four-momentum transfer squared Q2.')
-parser.add_argument('-o', dest='outdir', default='results/dis/', help='Output directory.')
-args = parser.parse_args()
-kwargs = vars(args)
+#logarithmically spaced bins in Q2 and 𝑥
+Q2_bins = [0.40938507,0.64786184,1.025353587,1.626191868,2.581181894,4.091148983,6.478618696,10.25353599,16.26191868,25.81181894,40.91148983,64.78618696,102.5353599,162.6191868,258.1181894,409.1148983,647.8618696,1025.353599,1626.191868,2581.181894,4091.148983,6482.897648]
+x_bins = [4.09385E-05,6.47862E-05,0.000102535,0.000162619,0.000258118,0.000409115,0.000647862,0.001025354,0.001626192,0.002581182,0.004091149,0.006478619,0.010253536,0.016261919,0.025811819,0.04091149,0.064786187,0.10253536,0.162619187,0.25811819,0.409114898,0.647861868,1.025257131]
 
-rec_file = args.rec_file
-minq2 = int(args.minq2)
-k = int(args.ebeam)
-p = int(args.pbeam)
+method_dict = {'e':'Electron','DA':'Double-Angle','JB':'Jacquet-Blondel','Sigma':'Sigma','eSigma':'e-Sigma'}
+method_collection_dict = {'T':'InclusiveKinematicsTruth','e':'InclusiveKinematicsElectron','DA':'InclusiveKinematicsDA','JB':'InclusiveKinematicsJB',
+                          'Sigma':'InclusiveKinematicsSigma','eSigma':'InclusiveKinematicseSigma'}
+kinematics_branches = [collection + leaf for collection in method_collection_dict.values() for leaf in ['.Q2', '.x']]
+minq2_dict = {'1':2,'10':7,'100':12,'1000':17} #Q2 bin index at which minq2 starts
 
 
 
-#logarithmically spaced bins in Q2 and 𝑥 
-Q2_bins = [0.40938507,0.64786184,1.025353587,1.626191868,2.581181894,4.091148983,6.478618696,10.25353599,16.26191868,25.81181894,40.91148983,64.78618696,102.5353599,162.6191868,258.1181894,409.1148983,647.8618696,1025.353599,1626.191868,2581.181894,4091.148983,6482.897648]
-x_bins = [4.09385E-05,6.47862E-05,0.000102535,0.000162619,0.000258118,0.000409115,0.000647862,0.001025354,0.001626192,0.002581182,0.004091149,0.006478619,0.010253536,0.016261919,0.025811819,0.04091149,0.064786187,0.10253536,0.162619187,0.25811819,0.409114898,0.647861868,1.025257131]
+#per-event [Q2, x] values of a collection with one entry per event, NaN for the events without entry
+def event_values(keys, collection):
+    import awkward as ak
+    counts = ak.to_numpy(ak.num(keys[collection + '.Q2']))
+    filled = counts > 0
+    first = (np.cumsum(counts) - counts)[filled]
+    values = []
+    for leaf in ['.Q2', '.x']:
+        flat = ak.to_numpy(ak.flatten(keys[collection + leaf]))
+        per_event = np.full(len(counts), np.nan, dtype=flat.dtype)
+        per_event[filled] = flat[first]
+        values.append(per_event)
+    return values
 
 
 
-#function to construct Q2 correlation plots
-def Q2correlation(minq2,method): #minq2 can be 1,10,100, or 1000; method can be 'e','DA', or 'JB'
-
-    Q2values_Y = method_Q2values_dict['{}'.format(method)]  #Q2 values of the given method, that are mapped onto the y axis 
-    
-    Q2_List_T = Q2values_T #Truth Q2 values, mapped along x axis
-    Q2_List_Y = Q2values_Y #method (E/DA/JB) Q2 values, mapped along y axis
-
-    T_len = ak.count(Q2_List_T,axis=0) #total number of events in Truth
-    Y_len = ak.count(Q2_List_Y,axis=0) #total number of events in method
-
-    if T_len > Y_len: #if total number of events for Truth is greater
-        Y_boolean = ak.count(Q2_List_Y,axis=-1) >= 1 #boolean to filter ak.Arrays wrt single events in method 
-        Q2_List_T_F = Q2_List_T[Y_boolean] #filtered Truth Q2 values
-        Q2_List_Y_F = Q2_List_Y[Y_boolean] #filtered method Q2 values
-    else: #if total number of events for method is greater
-        T_boolean = ak.count(Q2_List_T,axis=-1) >= 1 #boolean to filter ak.Arrays wrt single events in Truth
-        Q2_List_T_F = Q2_List_T[T_boolean] #filtered Truth Q2 values
-        Q2_List_Y_F = Q2_List_Y[T_boolean] #filtered method Q2 values
-    
-    T_Q2s = np.array(ak.flatten(Q2_List_T_F)) #Truth Q2 values, mapped along x axis
-    Y_Q2s = np.array(ak.flatten(Q2_List_Y_F)) #method Q2 values, mapped along y axis
-    
-    #2-dimensional histogram, h
-    h, xedges, yedges = np.histogram2d(x=T_Q2s,y=Y_Q2s, bins=[Q2_bins,Q2_bins]) 
-
-    minq2_dict = {'1':2,'10':7,'100':12,'1000':17} #Q2 bin index at which minq2 starts
-    h[0:minq2_dict['{}'.format(minq2)]]=0 #ignore values before minq2
-
-    #normalization of h:
-    col_sum = ak.sum(h,axis=-1) #number of events in each (verticle) column 
-    norm_h = [] #norm_h is the normalized matrix
-    norm_h_text = [] #display labels matrix
-    for i in range(len(col_sum)):
-        if col_sum[i] != 0:
-            norm_c = h[i]/col_sum[i] #normalized column = column values divide by sum of the column
+#per-event [Q2, x] values of Truth and each method from the arrays of the Q2 and x leaves
+#methods without InclusiveKinematics collection in the file (e.g. Sigma and eSigma in older productions) are skipped
+def kinematics_values(keys):
+    return {method: event_values(keys, collection) for method, collection in method_collection_dict.items()
+            if collection + '.Q2' in keys.fields}
+
+
+
+#per-event [Q2, x] values of Truth and each method, read in one pass over the events tree with only the Q2 and x leaves
+def read_kinematics(events):
+    return kinematics_values(events.arrays(filter_name=kinematics_branches))
+
+
+
+#per-event [Q2, x] values of Truth and each method, read from the files in chunks of step_size to bound the memory
+#with an NtupleCache, the Q2 and x leaves of each file are memory-mapped from the cache instead
+def iterate_kinematics(rec_files, step_size='100 MB', cache=None):
+    import uproot as ur
+    if cache is not None:
+        for rec_file in rec_files:
+            yield kinematics_values(cache.arrays(rec_file + ':events', kinematics_branches))
+        return
+    for keys in ur.iterate([rec_file + ':events' for rec_file in rec_files], filter_name=kinematics_branches, step_size=step_size):
+        yield kinematics_values(keys)
+
+
+
+#reconstructed files from paths, glob patterns, and @list files with one path or pattern per line
+def expand_rec_files(patterns):
+    rec_files = []
+    for pattern in patterns:
+        if pattern.startswith('@'):
+            with open(pattern[1:]) as f:
+                rec_files += expand_rec_files([line.strip() for line in f if line.strip() and not line.startswith('#')])
         else:
-            norm_c = h[i]
-        norm_h.append(norm_c)
-        norm_c_text = [ '%.3f' % elem for elem in norm_c ] #display value to 3 dp
-        norm_h_text.append(norm_c_text)
-    
+            rec_files += sorted(glob.glob(pattern)) or [pattern]
+    return rec_files
+
+
+
+#bin index of each value with the same binning as np.histogram (last bin closed), -1 for values outside the bins or NaN
+def bin_index(values, bins):
+    bins = np.asarray(bins)
+    idx = np.searchsorted(bins, values, side='right') - 1
+    idx[values == bins[-1]] = len(bins) - 2
+    idx[idx >= len(bins) - 1] = -1
+    return idx
+
+
+
+#2-dimensional histograms (truth bin, method bin) of all the methods, filled with a single bincount
+#the truth values are binned once, events are used if both truth and the method have a value and truth_mask is set
+def correlation_hists(truth_values, method_values, bins, truth_mask=None):
+    nbins = len(bins) - 1
+    truth_idx = bin_index(truth_values, bins)
+    if truth_mask is not None:
+        truth_idx[~truth_mask] = -1
+
+    keys = []
+    for imethod, values in enumerate(method_values.values()):
+        method_idx = bin_index(values, bins)
+        filled = (truth_idx >= 0) & (method_idx >= 0)
+        keys.append((imethod*nbins + truth_idx[filled])*nbins + method_idx[filled])
+    counts = np.bincount(np.concatenate(keys), minlength=len(method_values)*nbins*nbins)
+    return dict(zip(method_values.keys(), counts.reshape(len(method_values), nbins, nbins)))
+
+
+
+#normalization of h: each (verticle) column, i.e. truth bin, is divided by its number of events if not empty
+def normalize_columns(h):
+    col_sum = h.sum(axis=-1, keepdims=True)
+    return np.divide(h, col_sum, out=h.copy(), where=col_sum != 0)
+
+
+
+#raw counts of all the Q2 and Bjorken-x correlation histograms, in one pass over the truth values
+#the counts are additive, so the ones of chunks or files can be summed
+def correlation_counts(values, minq2, k, p):
+    methods = [method for method in method_dict if method in values]
+
+    Q2_counts = correlation_hists(values['T'][0], {method: values[method][0] for method in methods}, Q2_bins)
+
+    T_x_bool = values['T'][1]>=minq2/(4*k*p) #boolean to filter x values that satisfy bjorken-x equation for minq2, ebeam and pbeam
+    X_counts = correlation_hists(values['T'][1], {method: values[method][1] for method in methods}, x_bins, T_x_bool)
+
+    return Q2_counts, X_counts
+
+
+
+#add the counts of each method to the accumulated ones
+def add_counts(total, counts):
+    for method, h in counts.items():
+        total[method] = total[method] + h if method in total else h.copy()
+    return total
+
+
+
+#normalized Q2 and Bjorken-x correlation histograms from the raw counts
+def kinematics_correlations(Q2_counts, X_counts, minq2):
+    Q2_hists = {}
+    for method, counts in Q2_counts.items():
+        h = counts.astype(float)
+        h[0:minq2_dict['{}'.format(minq2)]]=0 #ignore values before minq2
+        Q2_hists[method] = normalize_columns(h)
+    X_hists = {method: normalize_columns(counts.astype(float)) for method, counts in X_counts.items()}
+    return Q2_hists, X_hists
+
+
+
+#raw counts, and the settings they were filled with, to a compressed .npz file
+def save_partial(path, Q2_counts, X_counts, minq2, k, p):
+    arrays = {'Q2_' + method: h for method, h in Q2_counts.items()}
+    arrays.update({'x_' + method: h for method, h in X_counts.items()})
+    np.savez_compressed(path, ebeam=k, pbeam=p, minq2=minq2, **arrays)
+
+
+
+def load_partial(path):
+    with np.load(path) as partial:
+        settings = (int(partial['minq2']), int(partial['ebeam']), int(partial['pbeam']))
+        Q2_counts = {key[3:]: partial[key] for key in partial.files if key.startswith('Q2_')}
+        X_counts = {key[2:]: partial[key] for key in partial.files if key.startswith('x_')}
+    return Q2_counts, X_counts, settings
+
+
+
+#matplotlib with the non-interactive Agg backend, pyplot and mplhep
+def plotting_modules():
+    import matplotlib as mpl
+    mpl.use('Agg')
+    import matplotlib.pyplot as plt
+    import mplhep
+    return mpl, plt, mplhep
+
+
+
+#function to construct Q2 correlation plots
+def Q2correlation(norm_h,minq2,method,k,p,outdir,fast=False): #minq2 can be 1,10,100, or 1000; method can be 'e','DA', or 'JB'
+    if fast: #no per-cell labels, they dominate the rendering time
+        norm_h_text = None
+    else:
+        norm_h_text = [[ '%.3f' % elem for elem in norm_c ] for norm_c in norm_h] #display value to 3 dp
+
+    mpl, plt, mplhep = plotting_modules()
     fig = plt.figure()
     mplhep.hist2dplot(H=norm_h,norm=mpl.colors.LogNorm(vmin= 1e-4, vmax= 1),labels=norm_h_text,xbins=Q2_bins,ybins=Q2_bins)
     plt.yscale('log')
@@ -85,54 +194,19 @@ def Q2correlation(minq2,method): #minq2 can be 1,10,100, or 1000; method can be
     plt.xlabel('$Q^2$ [$GeV^2$] Truth')
     plt.ylabel('$Q^2$ [$GeV^2$] {}'.format(method_dict['{}'.format(method)]))
     plt.title('{}   $Q^2$ correlation   {}x{}   $minQ^2=${}$GeV^2$'.format(method_dict['{}'.format(method)],k,p,minq2))
-    plt.show()
-    plt.savefig(os.path.join(args.outdir, '%gon%g/minQ2=%g/Q2_correlation_%s_%gx%g_minQ2=%g.png' %(k,p,minq2,method,k,p,minq2)))
+    plt.savefig(os.path.join(outdir, '%gon%g/minQ2=%g/Q2_correlation_%s_%gx%g_minQ2=%g.png' %(k,p,minq2,method,k,p,minq2)))
+    plt.close(fig)
 
 
 
 #function to construct Bjorken-x correlation plots
-def Xcorrelation(minq2,method): #minq2 can be 1,10,100, or 1000; method can be 'e','DA', or 'JB'
-
-    Xvalues_Y = method_Xvalues_dict['{}'.format(method)] #x values of the given method, that are mapped onto the y axis 
-        
-    X_List_T = Xvalues_T #Truth x values, mapped along x axis
-    X_List_Y = Xvalues_Y #method (E/DA/JB) x values, mapped along y axis
-
-    T_len = ak.count(X_List_T,axis=0) #total number of events in Truth
-    Y_len = ak.count(X_List_Y,axis=0) #total number of events in method
-
-    if T_len > Y_len: #if total number of events for Truth is greater
-        Y_boolean = ak.count(X_List_Y,axis=-1) >= 1 #boolean to filter ak.Arrays wrt single events in method 
-        X_List_T_F = X_List_T[Y_boolean] #filtered Truth x values
-        X_List_Y_F = X_List_Y[Y_boolean] #filtered method x values
-    else: #if total number of events for method is greater
-        T_boolean = ak.count(X_List_T,axis=-1) >= 1 #boolean to filter ak.Arrays wrt single events in Truth
-        X_List_T_F = X_List_T[T_boolean] #filtered Truth x values
-        X_List_Y_F = X_List_Y[T_boolean] #filtered method x values
-    
-    T_Xs = np.array(ak.flatten(X_List_T_F)) #Truth Bjorken-x values, mapped along x axis
-    Y_Xs = np.array(ak.flatten(X_List_Y_F)) #method Bjorken-x values, mapped along y axis
-    
-    T_x_bool = T_Xs>=minq2/(4*k*p) #boolean to filter x values that satisfy bjorken-x equation for minq2, ebeam and pbeam
-    T_Xs = T_Xs[T_x_bool]
-    Y_Xs = Y_Xs[T_x_bool]
-
-    #2-dimensional histogram, h
-    h, xedges, yedges = np.histogram2d(x=T_Xs,y=Y_Xs, bins=[x_bins,x_bins])
-    
-    #normalization of h:
-    col_sum = ak.sum(h,axis=-1) #number of events in each (verticle) column 
-    norm_h = [] #norm_h is the normalized matrix
-    norm_h_text = [] #display labels matrix
-    for i in range(len(col_sum)):
-        if col_sum[i] != 0:
-            norm_c = h[i]/col_sum[i] #normalized column = column values divide by sum of the column
-        else:
-            norm_c = h[i]
-        norm_h.append(norm_c)
-        norm_c_text = [ '%.2f' % elem for elem in norm_c ] #display value to 2 dp
-        norm_h_text.append(norm_c_text)
+def Xcorrelation(norm_h,minq2,method,k,p,outdir,fast=False): #minq2 can be 1,10,100, or 1000; method can be 'e','DA', or 'JB'
+    if fast: #no per-cell labels, they dominate the rendering time
+        norm_h_text = None
+    else:
+        norm_h_text = [[ '%.2f' % elem for elem in norm_c ] for norm_c in norm_h] #display value to 2 dp
 
+    mpl, plt, mplhep = plotting_modules()
     fig = plt.figure()
     mplhep.hist2dplot(H=norm_h,norm=mpl.colors.LogNorm(vmin= 1e-4, vmax= 1),labels=norm_h_text,xbins=x_bins,ybins=x_bins)
     plt.yscale('log')
@@ -142,36 +216,92 @@ def Xcorrelation(minq2,method): #minq2 can be 1,10,100, or 1000; method can be '
     plt.xlabel('x Truth')
     plt.ylabel('$x$   {}'.format(method_dict['{}'.format(method)]))
     plt.title('{}   $x$ correlation   {}x{}   $minQ^2=${}$GeV^2$'.format(method_dict['{}'.format(method)],k,p,minq2))
-    plt.show()
-    plt.savefig(os.path.join(args.outdir, '%gon%g/minQ2=%g/x_correlation_%s_%gx%g_minQ2=%g.png' %(k,p,minq2,method,k,p,minq2)))
-
-
-
-keys = ur.concatenate(rec_file + ':events/' + 'InclusiveKinematicsTruth')
-Truth =   [keys['InclusiveKinematicsTruth.Q2'],keys['InclusiveKinematicsTruth.x']]
-keys = ur.concatenate(rec_file + ':events/' + 'InclusiveKinematicsElectron')
-Electron =   [keys['InclusiveKinematicsElectron.Q2'], keys['InclusiveKinematicsElectron.x']]
-keys = ur.concatenate(rec_file + ':events/' + 'InclusiveKinematicsDA')
-DoubleAngle =  [keys['InclusiveKinematicsDA.Q2'], keys['InclusiveKinematicsDA.x']]
-keys = ur.concatenate(rec_file + ':events/' + 'InclusiveKinematicsJB')
-JacquetBlondel =  [keys['InclusiveKinematicsJB.Q2'], keys['InclusiveKinematicsJB.x']]
-
-Q2values_T = Truth[0]
-Q2values_E = Electron[0]
-Q2values_DA = DoubleAngle[0]
-Q2values_JB = JacquetBlondel[0]
-Xvalues_T = Truth[1]
-Xvalues_E = Electron[1]
-Xvalues_DA = DoubleAngle[1]
-Xvalues_JB = JacquetBlondel[1]
-
-method_dict = {'e':'Electron','DA':'Double-Angle','JB':'Jacquet-Blondel'}
-method_Q2values_dict = {'e':Q2values_E,'DA':Q2values_DA,'JB':Q2values_JB}
-method_Xvalues_dict = {'e':Xvalues_E,'DA':Xvalues_DA,'JB':Xvalues_JB}
-
-Q2correlation(minq2,'e')
-Xcorrelation(minq2,'e')
-Q2correlation(minq2,'DA')
-Xcorrelation(minq2,'DA')
-Q2correlation(minq2,'JB')
-Xcorrelation(minq2,'JB')
+    plt.savefig(os.path.join(outdir, '%gon%g/minQ2=%g/x_correlation_%s_%gx%g_minQ2=%g.png' %(k,p,minq2,method,k,p,minq2)))
+    plt.close(fig)
+
+
+
+#render one figure, (plot function, arguments)
+def render(task):
+    plot, plot_args = task
+    plot(*plot_args)
+
+
+
+#render the figures, in a process pool if jobs > 1
+def render_all(tasks, jobs=1):
+    if jobs > 1:
+        with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+            pool.map(render, tasks)
+    else:
+        for task in tasks:
+            render(task)
+
+
+
+def step_size_arg(value):
+    return int(value) if value.isdigit() else value
+
+
+
+if __name__ == '__main__':
+    #merge mode: kinematics_correlations.py merge partial.npz [partial.npz ...]
+    merge = len(sys.argv) > 1 and sys.argv[1] == 'merge'
+
+    if merge:
+        parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]) + ' merge')
+        parser.add_argument('partials', nargs='+', help='Partial histogram files (.npz) written with --partial-out.')
+    else:
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--rec_file', type=str, nargs='+', required=True,
+                            help='Reconstructed track file(s), glob patterns or @file with one path per line.')
+        parser.add_argument('--ebeam', type=float, help='Electron beam energy.')
+        parser.add_argument('--pbeam', type=float, help='Proton (or ion) beam energy.')
+        parser.add_argument('--minq2', type=float, help='Minimum four-momentum transfer squared Q2.')
+        parser.add_argument('--step-size', dest='step_size', type=step_size_arg, default='100 MB',
+                            help='Chunk size to read the files, in entries (e.g. 100000) or memory size (e.g. "100 MB").')
+        parser.add_argument('--ntuple-cache', dest='ntuple_cache', default=None,
+                            help='Directory of the reduced ntuple cache, the Q2 and x leaves are read from the ROOT files once '
+                                 'and memory-mapped from the cache afterwards.')
+        parser.add_argument('--ntuple-cache-size', dest='ntuple_cache_size', type=parse_size, default=DEFAULT_MAX_BYTES,
+                            help='Size cap of the reduced ntuple cache (e.g. "2 GB"), least recently used entries are evicted.')
+    parser.add_argument('--partial-out', dest='partial_out', default=None,
+                        help='Write the raw histogram counts to this .npz file instead of plotting.')
+    parser.add_argument('-o', dest='outdir', default='results/dis/', help='Output directory.')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help='Number of processes to render the figures.')
+    parser.add_argument('--fast', action='store_true', default=False,
+                        help='Fast rendering without the per-cell value labels.')
+    args = parser.parse_args(sys.argv[2:] if merge else sys.argv[1:])
+
+    Q2_counts = {}
+    X_counts = {}
+    if merge:
+        settings = None
+        for partial in args.partials:
+            Q2_partial, X_partial, partial_settings = load_partial(partial)
+            if settings is not None and partial_settings != settings:
+                parser.error('{} was filled with minq2, ebeam, pbeam = {}, expected {}'.format(partial, partial_settings, settings))
+            settings = partial_settings
+            add_counts(Q2_counts, Q2_partial)
+            add_counts(X_counts, X_partial)
+        minq2, k, p = settings
+    else:
+        minq2 = int(args.minq2)
+        k = int(args.ebeam)
+        p = int(args.pbeam)
+        cache = NtupleCache(args.ntuple_cache, args.ntuple_cache_size) if args.ntuple_cache else None
+        for values in iterate_kinematics(expand_rec_files(args.rec_file), args.step_size, cache):
+            Q2_chunk, X_chunk = correlation_counts(values, minq2, k, p)
+            add_counts(Q2_counts, Q2_chunk)
+            add_counts(X_counts, X_chunk)
+
+    if args.partial_out:
+        save_partial(args.partial_out, Q2_counts, X_counts, minq2, k, p)
+        sys.exit(0)
+
+    Q2_hists, X_hists = kinematics_correlations(Q2_counts, X_counts, minq2)
+    tasks = []
+    for method in Q2_hists:
+        tasks.append((Q2correlation, (Q2_hists[method],minq2,method,k,p,args.outdir,args.fast)))
+        tasks.append((Xcorrelation, (X_hists[method],minq2,method,k,p,args.outdir,args.fast)))
+    render_all(tasks, args.jobs)
@@ -0,0 +1,31 @@
+# Options file running one calorimeter chain of options/reconstruction.py in isolation
+#
+# JUGGLER_PERF_CHAIN is the collection name prefix of the chain (e.g. EcalEndcapP), the algorithms
+# producing these collections and the algorithms they depend on are run, and only the clusters
+# of the chain are written. The other environment variables are those of options/reconstruction.py.
+import os
+import sys
+import runpy
+
+from Configurables import ApplicationMgr
+
+options_dir = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "options"
+)
+sys.path.insert(0, options_dir)
+from reco_common import dataflow as reco_dataflow
+
+chain = os.environ["JUGGLER_PERF_CHAIN"]
+
+reco = runpy.run_path(os.path.join(options_dir, "reconstruction.py"))
+algorithms = reco_dataflow.select_algorithms(
+    reco["algorithms"], lambda coll: coll.startswith(chain)
+)
+if len(algorithms) <= 2:
+    raise ValueError("no algorithm produces a collection starting with {}".format(chain))
+print("{} chain: {}".format(chain, ", ".join(alg.name() for alg in algorithms)))
+
+reco["podout"].outputCommands = ["drop *", "keep {}*Clusters".format(chain)]
+reco["podin"].collections = reco_dataflow.prune_inputs(algorithms, reco["sim_coll"])
+
+ApplicationMgr(TopAlg=algorithms)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import itertools
+import subprocess
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../scripts'))
+from gaudi_audit_report import parse_log
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CHAIN_OPTIONS = os.path.join(BENCH_DIR, 'calo_chain.py')
+TARGETS_FILE = os.path.join(BENCH_DIR, 'targets.json')
+
+# calorimeter chains, by the collection prefix of options/reconstruction.py, and the polar angle
+# range (degree) of the generated particles hitting them
+CHAINS = {
+    'EcalEndcapP': (10., 20.),
+    'EcalEndcapN': (160., 170.),
+    'EcalBarrel': (60., 120.),
+    'HcalEndcapP': (10., 20.),
+    'HcalEndcapN': (160., 170.),
+    'HcalBarrel': (60., 120.),
+}
+# the events have one particle, the occupancy of the calorimeters grows with the energy and is
+# larger for hadronic showers
+PARTICLES = ['e-', 'pi-']
+ENERGIES = [1., 5., 20.]
+# the samples are generated once with this seed, so that every run reconstructs the same events
+SEED = 20221
+
+# algorithms of the calo_chain.py options which are not part of the calorimeter chain
+IO_ALGORITHMS = ['PodioReader', 'out']
+# algorithm list printed by calo_chain.py
+CHAIN_RE = re.compile(r'^\w+ chain: (?P<algorithms>.*)$', re.MULTILINE)
+# regression margins of the targets written with --update-targets
+THROUGHPUT_MARGIN = 0.8
+RSS_MARGIN = 1.25
+
+
+def sample_name(chain, particle, energy):
+    return '{}_{}_{:g}GeV'.format(chain, particle, energy)
+
+
+def run(cmd, log, env=None):
+    """
+    Run a command with its output written to log, returns the wall time (s) and maximum resident set size (MB)
+    """
+    print(' '.join(cmd))
+    start = time.time()
+    with open(log, 'w') as f:
+        proc = subprocess.Popen(cmd, stdout=f, stderr=subprocess.STDOUT, env=env)
+        _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.time() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        sys.exit('ERROR running {}, see {}'.format(cmd[0], log))
+    # ru_maxrss is in kB on Linux
+    return wall, usage.ru_maxrss/1024.
+
+
+def simulate(args, chain, particle, energy):
+    """
+    Generate and simulate the fixed sample of a chain, unless the simulation output exists
+    """
+    name = sample_name(chain, particle, energy)
+    gen_file = os.path.join(args.data_dir, name + '.hepmc')
+    sim_file = os.path.join(args.data_dir, name + '.edm4hep.root')
+    if os.path.exists(sim_file):
+        print('Skipping the simulation of {}, {} exists'.format(name, sim_file))
+        return sim_file
+    angmin, angmax = CHAINS[chain]
+    run([sys.executable, os.path.join(BENCH_DIR, '../../scripts/gen_particles.py'), gen_file,
+         '-n', str(args.nev), '-s', str(SEED), '--parray', '{:g}'.format(energy), '--particles', particle,
+         '--angmin', str(angmin), '--angmax', str(angmax)],
+        os.path.join(args.log_dir, name + '.gen.log'))
+    run(['ddsim', '--runType', 'batch', '--printLevel', 'WARNING', '--part.minimalKineticEnergy', '1*TeV',
+         '--filter.tracker', 'edep0', '--numberOfEvents', str(args.nev),
+         '--compactFile', '{}/{}.xml'.format(os.environ['DETECTOR_PATH'], os.environ['DETECTOR_CONFIG']),
+         '--inputFiles', gen_file, '--outputFile', sim_file],
+        os.path.join(args.log_dir, name + '.sim.log'))
+    return sim_file
+
+
+def reconstruct(args, chain, particle, energy, sim_file):
+    """
+    Run the chain on a sample with the ChronoAuditor, returns its throughput and memory
+    """
+    name = sample_name(chain, particle, energy)
+    log = os.path.join(args.log_dir, name + '.rec.log')
+    env = dict(os.environ, JUGGLER_PERF_CHAIN=chain, JUGGLER_PROFILE='chrono', JUGGLER_SIM_FILE=sim_file,
+               JUGGLER_REC_FILE=os.path.join(args.data_dir, name + '.rec.root'), JUGGLER_N_EVENTS=str(args.nev))
+    wall, rss = run(['gaudirun.py', CHAIN_OPTIONS], log, env=env)
+    unresolved = []
+    with open(log, errors='replace') as f:
+        lines = f.readlines()
+    algorithms = [alg for alg in parse_log(lines, unresolved) if alg['name'] not in IO_ALGORITHMS]
+    # every algorithm of the chain, as printed by calo_chain.py, must be timed, otherwise the throughput is overestimated
+    chain_line = CHAIN_RE.search(''.join(lines))
+    if chain_line is None:
+        sys.exit('ERROR no algorithm list of the {} chain in {}'.format(chain, log))
+    expected = [name.strip() for name in chain_line.group('algorithms').split(',')]
+    timed = [alg['name'] for alg in algorithms if alg['calls'] > 0]
+    missing = [name for name in expected if name not in IO_ALGORITHMS and name not in timed]
+    if missing or unresolved:
+        sys.exit('ERROR no ChronoAuditor execute time of {} in {}'.format(', '.join(missing + unresolved), log))
+    cpu = sum(alg['cpu_total'] for alg in algorithms)
+    events = max([alg['calls'] for alg in algorithms] + [0])
+    if not algorithms or events == 0 or cpu <= 0:
+        sys.exit('ERROR no ChronoAuditor output of the {} chain in {}'.format(chain, log))
+    return {
+        'chain': chain,
+        'particle': particle,
+        'energy': energy,
+        'events': events,
+        'cpu_total': cpu,
+        'events_per_second': events/cpu,
+        'wall_time': wall,
+        'rss_max': rss,
+        'algorithms': {alg['name']: alg['cpu_mean'] for alg in algorithms},
+    }
+
+
+def make_tests(results, targets, require_targets=False):
+    """
+    common_bench tests of the throughput (higher is better) and memory (lower is better) of each sample,
+    a sample without target passes, or fails with require_targets
+    """
+    tests = []
+    for res in results:
+        name = sample_name(res['chain'], res['particle'], res['energy'])
+        target = targets.get(name, {})
+        for key, quantity, title, higher in [('events_per_second', 'events/s', 'throughput', True),
+                                             ('rss_max', 'MB', 'maximum RSS', False)]:
+            value = res[key]
+            ref = target.get(key)
+            if ref is None:
+                passed = not require_targets
+            else:
+                passed = value >= ref if higher else value <= ref
+            tests.append({
+                'name': '{}_{}'.format(name, key),
+                'title': '{} {} ({} {:g} GeV)'.format(res['chain'], title, res['particle'], res['energy']),
+                'description': '{} of the {} chain alone, {} events of {} {:g} GeV'.format(
+                    title, res['chain'], res['events'], res['particle'], res['energy']),
+                'quantity': quantity,
+                'target': '-' if ref is None else '{:.4g}'.format(ref),
+                'value': '{:.4g}'.format(value),
+                'result': 'pass' if passed else 'fail',
+                'weight': 1.0,
+            })
+    return tests
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Events per second and memory of each calorimeter reconstruction chain run alone on '
+                    'fixed single particle samples')
+    parser.add_argument('-n', type=int, default=200, dest='nev', help='number of events per sample')
+    parser.add_argument('--chains', type=str, default=','.join(CHAINS), help='chains to run, separated by ","')
+    parser.add_argument('--particles', type=str, default=','.join(PARTICLES),
+                        help='particles of the samples, separated by ","')
+    parser.add_argument('--energies', type=str, default=','.join('{:g}'.format(e) for e in ENERGIES),
+                        help='energies of the samples in GeV, separated by ","')
+    parser.add_argument('--data-dir', type=str, default='sim_output/perf', dest='data_dir',
+                        help='directory of the generated, simulated and reconstructed samples')
+    parser.add_argument('--results-dir', type=str, default='results/perf', dest='results_dir',
+                        help='directory of the test results and logs')
+    parser.add_argument('--simulate-only', action='store_true', default=False, dest='simulate_only',
+                        help='only generate and simulate the samples')
+    parser.add_argument('--update-targets', action='store_true', default=False, dest='update_targets',
+                        help='write the targets of the measured samples to {}, with margins of x{} (throughput) '
+                             'and x{} (RSS)'.format(TARGETS_FILE, THROUGHPUT_MARGIN, RSS_MARGIN))
+    parser.add_argument('--require-targets', action='store_true', default=False, dest='require_targets',
+                        help='fail the samples without target, instead of passing them')
+    args = parser.parse_args()
+
+    chains = [c.strip() for c in args.chains.split(',') if c.strip()]
+    unknown = [c for c in chains if c not in CHAINS]
+    if unknown:
+        parser.error('unknown chains {}, available: {}'.format(', '.join(unknown), ', '.join(CHAINS)))
+    particles = [p.strip() for p in args.particles.split(',') if p.strip()]
+    energies = [float(e) for e in args.energies.split(',') if e.strip()]
+    args.log_dir = os.path.join(args.results_dir, 'logs')
+    os.makedirs(args.data_dir, exist_ok=True)
+    os.makedirs(args.log_dir, exist_ok=True)
+
+    results = []
+    for chain, particle, energy in itertools.product(chains, particles, energies):
+        sim_file = simulate(args, chain, particle, energy)
+        if not args.simulate_only:
+            results.append(reconstruct(args, chain, particle, energy, sim_file))
+    if args.simulate_only:
+        sys.exit(0)
+
+    targets = {}
+    if os.path.exists(TARGETS_FILE):
+        with open(TARGETS_FILE) as f:
+            targets = json.load(f)
+    if args.update_targets:
+        for res in results:
+            targets[sample_name(res['chain'], res['particle'], res['energy'])] = {
+                'events_per_second': round(res['events_per_second']*THROUGHPUT_MARGIN, 2),
+                'rss_max': round(res['rss_max']*RSS_MARGIN, 1),
+            }
+        with open(TARGETS_FILE, 'w') as f:
+            json.dump(targets, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    tests = make_tests(results, targets, args.require_targets and not args.update_targets)
+    with open(os.path.join(args.results_dir, 'calo_throughput.json'), 'w') as f:
+        json.dump({'tests': tests}, f, indent=2)
+    # per-algorithm details, next to the logs so that they are not collected as tests
+    with open(os.path.join(args.log_dir, 'calo_throughput_details.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    for test in tests:
+        print('{:<6} {}: {} {} (target {})'.format(test['result'], test['title'], test['value'], test['quantity'],
+                                                  test['target']))
+    if any(test['result'] == 'fail' for test in tests):
+        sys.exit(1)
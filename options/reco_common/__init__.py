@@ -0,0 +1,4 @@
+# Shared helpers of the reconstruction options files in options/*.py
+#
+# This package is not an options file itself: it lives in a sub-directory so that the
+# `for rec in options/*.py` loops of the benchmark scripts do not pick it up.
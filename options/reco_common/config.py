@@ -0,0 +1,213 @@
+import os
+import ast
+import json
+import time
+import getpass
+import hashlib
+import operator
+import tempfile
+
+# start of the options file setup, this module is imported first by the options files
+SETUP_START = time.perf_counter()
+
+# format of the on-disk cache files, the source of this module is part of the key as well
+CACHE_VERSION = 1
+
+_cache = {}
+_timings = {}
+_source_hash = None
+
+_operators = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+def units():
+    from GaudiKernel import SystemOfUnits
+
+    return {
+        name: value
+        for name, value in vars(SystemOfUnits).items()
+        if not name.startswith("_") and isinstance(value, (int, float))
+    }
+
+
+def eval_units(expr, names=None):
+    """Evaluate a unit expression such as "20*MeV" or "-0.5*mm"
+
+    Only numbers, the Gaudi SystemOfUnits names and + - * / ** are allowed, unlike eval().
+    """
+    if isinstance(expr, (int, float)):
+        return expr
+    names = units() if names is None else names
+
+    def _eval(node):
+        if isinstance(node, ast.Expression):
+            return _eval(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.Name) and node.id in names:
+            return names[node.id]
+        if isinstance(node, ast.BinOp) and type(node.op) in _operators:
+            return _operators[type(node.op)](_eval(node.left), _eval(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _operators:
+            return _operators[type(node.op)](_eval(node.operand))
+        raise ValueError("unsupported unit expression: {!r}".format(expr))
+
+    return _eval(ast.parse(str(expr).strip(), mode="eval"))
+
+
+def cache_dir():
+    """On-disk cache of the parsed calibrations, shared by the gaudirun.py jobs of a sample
+
+    JUGGLER_OPTIONS_CACHE, or a per-user directory in the temporary directory.
+    """
+    if "JUGGLER_OPTIONS_CACHE" in os.environ:
+        return os.environ["JUGGLER_OPTIONS_CACHE"]
+    try:
+        user = getpass.getuser()
+    except (KeyError, OSError):
+        # no USER/LOGNAME and no passwd entry for the uid, e.g. in a container
+        user = str(os.getuid())
+    return os.path.join(tempfile.gettempdir(), "juggler-options-{}".format(user))
+
+
+def source_hash():
+    """SHA1 of this module, so that a change of the parsers invalidates the on-disk cache"""
+    global _source_hash
+    if _source_hash is None:
+        with open(__file__, "rb") as f:
+            _source_hash = hashlib.sha1(f.read()).hexdigest()
+    return _source_hash
+
+
+def cached(name, detector_path, files, parse):
+    """Result of parse(paths), cached in memory and on disk
+
+    The cache key is the name, the detector path, the mtime and size of each file and the source
+    of this module, so an updated calibration file or parser is parsed again. parse must return
+    JSON-serializable data.
+    """
+    paths = [os.path.join(detector_path, f) for f in files]
+    stats = [(p, os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in paths]
+    key = hashlib.sha1(
+        json.dumps(
+            [CACHE_VERSION, source_hash(), name, os.path.abspath(detector_path), stats]
+        ).encode()
+    ).hexdigest()
+    if key in _cache:
+        return _cache[key]
+
+    t0 = time.perf_counter()
+    cache_file = None
+    try:
+        # resolved here rather than at import, e.g. tempfile raises without a usable directory
+        cache_file = os.path.join(cache_dir(), "{}-{}.json".format(name, key))
+        with open(cache_file) as f:
+            result = json.load(f)
+    except (IOError, OSError, ValueError):
+        result = parse(*paths)
+        try:
+            if cache_file is not None:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+                with open(tmp_file, "w") as f:
+                    json.dump(result, f)
+                os.replace(tmp_file, cache_file)
+        except (IOError, OSError):
+            # the cache is an optimization only, e.g. read-only file system
+            pass
+    _timings[name] = time.perf_counter() - t0
+    _cache[key] = result
+    return result
+
+
+def _parse_calo_daq(path):
+    with open(path) as f:
+        calo_config = json.load(f)
+    names = units()
+    calo_daq = {}
+    ## add proper ADC capacity based on bit depth
+    for det, cfg in calo_config.items():
+        calo_daq[det] = {
+            "dynamicRangeADC": eval_units(cfg["dynamicRange"], names),
+            "capacityADC": 2 ** int(cfg["capacityBitsADC"]),
+            "pedestalMean": int(cfg["pedestalMean"]),
+            "pedestalSigma": float(cfg["pedestalSigma"]),
+        }
+    return calo_daq
+
+
+def calo_daq(detector_path):
+    """Calorimeter DAQ info from calibrations/calo_digi_default.json"""
+    return cached(
+        "calo_daq", detector_path, ["calibrations/calo_digi_default.json"], _parse_calo_daq
+    )
+
+
+def _parse_emcal_barrel_calibration(path):
+    with open(path) as f:
+        return json.load(f)["electron"]
+
+
+def emcal_barrel_calibration(detector_path):
+    """Electron calibration of the barrel ECal from calibrations/emcal_barrel_calibration.json"""
+    return cached(
+        "emcal_barrel_calibration",
+        detector_path,
+        ["calibrations/emcal_barrel_calibration.json"],
+        _parse_emcal_barrel_calibration,
+    )
+
+
+def _parse_ffi_zdc(path):
+    with open(path) as f:
+        ffi_zdc_config = json.load(f)
+    names = units()
+    result = {}
+    for det in ["ffi_zdc_ecal", "ffi_zdc_hcal"]:
+        ffi_zdc_cal = ffi_zdc_config[det]
+        result[det] = {
+            "sampling_fraction": float(ffi_zdc_cal["sampling_fraction"]),
+            "cluster_kwargs": {
+                "minClusterCenterEdep": eval_units(ffi_zdc_cal["minClusterCenterEdep"], names),
+                "minClusterHitEdep": eval_units(ffi_zdc_cal["minClusterHitEdep"], names),
+                "localDistXY": [
+                    eval_units(ffi_zdc_cal["localDistXY"][0], names),
+                    eval_units(ffi_zdc_cal["localDistXY"][1], names),
+                ],
+                "splitCluster": bool(ffi_zdc_cal["splitCluster"]),
+            },
+        }
+    return result
+
+
+def ffi_zdc_calibration(detector_path):
+    """ZDC sampling fractions and clustering parameters from calibrations/ffi_zdc.json
+
+    Returns None if the file does not exist.
+    """
+    try:
+        return cached(
+            "ffi_zdc", detector_path, ["calibrations/ffi_zdc.json"], _parse_ffi_zdc
+        )
+    except (IOError, OSError):
+        return None
+
+
+def report_setup_time(options_file):
+    """Print the time spent in the options file setup, and in the calibration parsing"""
+    parsing = ", ".join("{} {:.3f} s".format(k, v) for k, v in _timings.items())
+    print(
+        "{}: options setup {:.3f} s{}".format(
+            os.path.basename(options_file),
+            time.perf_counter() - SETUP_START,
+            " (calibrations: {})".format(parsing) if parsing else "",
+        )
+    )
@@ -0,0 +1,118 @@
+import fnmatch
+
+# properties naming a collection read or written by an algorithm that do not start with
+# "input" or "output"
+EXTRA_INPUT_PROPERTIES = ["mcHits"]
+EXTRA_OUTPUT_PROPERTIES = ["trackingHits"]
+
+
+def _collections(value):
+    values = value if isinstance(value, (list, tuple)) else [value]
+    # DataHandle properties are DataHandle objects in recent Gaudi, strings before
+    names = [v.path() if hasattr(v, "path") else v for v in values]
+    return [n for n in names if isinstance(n, str) and n]
+
+
+def _property_collections(alg, match):
+    names = []
+    for prop in sorted(alg.getProperties()):
+        if match(prop):
+            names += _collections(alg.getProp(prop))
+    return names
+
+
+def input_collections(alg):
+    """Collections read by an algorithm, from its input* properties
+
+    PodioOutput reads the collections of the event store, they are not listed here.
+    """
+    if alg.getType() == "PodioInput":
+        return []
+    return _property_collections(
+        alg, lambda prop: prop.startswith("input") or prop in EXTRA_INPUT_PROPERTIES
+    )
+
+
+def output_collections(alg):
+    """Collections written by an algorithm, from its output* properties
+
+    For PodioInput, the collections it reads from the input file.
+    """
+    if alg.getType() == "PodioInput":
+        return _collections(alg.getProp("collections"))
+    if alg.getType() == "PodioOutput":
+        return []
+    return _property_collections(
+        alg,
+        lambda prop: (prop.startswith("output") and prop != "outputCommands")
+        or prop in EXTRA_OUTPUT_PROPERTIES,
+    )
+
+
+
+def kept_collections(commands, collections):
+    """Collections written by a PodioOutput with these outputCommands, the last matching command wins"""
+    kept = []
+    for coll in collections:
+        keep = False
+        for command in commands:
+            action, pattern = command.split()
+            if fnmatch.fnmatchcase(coll, pattern):
+                keep = action == "keep"
+        if keep:
+            kept.append(coll)
+    return kept
+
+
+def _related_collections(coll, collections):
+    # the contributions of the simulated calorimeter hits, and the particles the hits point to
+    related = [coll + "Contributions", "MCParticles"]
+    return [c for c in related if c in collections and c != coll]
+
+
+def prune_inputs(algorithms, collections):
+    """Collections of the input file (PodioInput) used by the algorithms, in the order of collections
+
+    A collection is used if it is read by an algorithm (input* properties) or written by a
+    PodioOutput, and the collections its objects point to are used with it. The unused
+    collections, and the collections read by an algorithm that are neither in the input file nor
+    produced before, are reported.
+    """
+    produced = set()
+    used = set()
+    for alg in algorithms:
+        if alg.getType() == "PodioOutput":
+            inputs = kept_collections(alg.getProp("outputCommands"), collections)
+        else:
+            inputs = input_collections(alg)
+        missing = [c for c in inputs if c not in collections and c not in produced]
+        if missing:
+            print("WARNING: {} reads unknown collections {}".format(alg.name(), ", ".join(missing)))
+        used.update(c for c in inputs if c in collections)
+        if alg.getType() != "PodioInput":
+            produced.update(output_collections(alg))
+
+    for coll in list(used):
+        used.update(_related_collections(coll, collections))
+    unused = [c for c in collections if c not in used]
+    if unused:
+        print("Not reading the unused input collections {}".format(", ".join(unused)))
+    return [c for c in collections if c in used]
+
+
+def select_algorithms(algorithms, produces):
+    """Algorithms producing a collection for which produces(name) is true, and the algorithms they depend on
+
+    PodioInput and PodioOutput are kept, the order of algorithms is preserved.
+    """
+    needed = set()
+    selected = []
+    for alg in reversed(algorithms):
+        outputs = output_collections(alg)
+        keep = alg.getType() in ["PodioInput", "PodioOutput"] or any(
+            produces(c) or c in needed for c in outputs
+        )
+        if keep:
+            selected.append(alg)
+            needed.update(input_collections(alg))
+    return selected[::-1]
@@ -0,0 +1,81 @@
+import os
+import shutil
+import subprocess
+
+# JUGGLER_PROFILE modes attaching an auditor to every algorithm
+AUDITORS = {
+    "chrono": "ChronoAuditor",
+    "mem": "MemStatAuditor",
+}
+# "perf" samples the whole gaudirun.py process with Linux perf, "none" disables the profiling
+MODES = list(AUDITORS) + ["perf", "none"]
+# the ChronoStatSvc prints the "algorithm:phase" tags as the message source, which the default
+# MessageSvc format cuts at 18 characters
+MESSAGE_FORMAT = "% F%50W%S%7W%R%T %0W%M"
+# seconds to wait for perf record to fail to attach before the job goes on
+PERF_ATTACH_TIMEOUT = 0.5
+
+
+def profile_modes(default=()):
+    """Profiling modes from JUGGLER_PROFILE, a comma-separated list of MODES, or default if unset"""
+    value = os.environ.get("JUGGLER_PROFILE")
+    if value is None:
+        return list(default)
+    modes = [m.strip() for m in value.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        raise ValueError(
+            "unknown JUGGLER_PROFILE mode {}, available: {}".format(
+                ", ".join(unknown), ", ".join(MODES)
+            )
+        )
+    return modes
+
+
+def attach_perf(output):
+    """Record the current process with perf record until it exits"""
+    perf = shutil.which("perf")
+    if perf is None:
+        print("WARNING: JUGGLER_PROFILE=perf but perf is not available, not profiling")
+        return None
+    print("Recording the profile of gaudirun.py to {}".format(output))
+    proc = subprocess.Popen(
+        [perf, "record", "--call-graph", "dwarf", "-o", output, "-p", str(os.getpid())],
+        stdout=subprocess.DEVNULL,
+    )
+    # perf exits at once if it cannot attach, e.g. with a restrictive perf_event_paranoid
+    try:
+        proc.wait(timeout=PERF_ATTACH_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return proc
+    print(
+        "WARNING: perf record exited with status {}, not profiling (see kernel.perf_event_paranoid)".format(
+            proc.returncode
+        )
+    )
+    return None
+
+
+def configure(services, output_rec, default=()):
+    """Attach the profiling selected by JUGGLER_PROFILE
+
+    The auditors are added to services through the AuditorSvc, the algorithms are audited with
+    ApplicationMgr(AuditAlgorithms=True), and the message source column is widened so that
+    scripts/gaudi_audit_report.py reads full tags. The perf data file is JUGGLER_PROFILE_OUTPUT,
+    or the output file name with a .perf.data extension.
+    """
+    from Configurables import AuditorSvc
+    from Gaudi.Configuration import MessageSvc
+
+    modes = profile_modes(default)
+    auditors = [auditor for mode, auditor in AUDITORS.items() if mode in modes]
+    if auditors:
+        services.append(AuditorSvc("AuditorSvc", Auditors=auditors))
+        MessageSvc().Format = MESSAGE_FORMAT
+    if "perf" in modes:
+        attach_perf(
+            os.environ.get(
+                "JUGGLER_PROFILE_OUTPUT", os.path.splitext(output_rec)[0] + ".perf.data"
+            )
+        )
+    return modes
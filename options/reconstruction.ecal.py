@@ -1,11 +1,17 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from reco_common import config as reco_config
+from reco_common import dataflow as reco_dataflow
+from reco_common import profiling as reco_profiling
+
 from Gaudi.Configuration import *
 
 from Configurables import ApplicationMgr, AuditorSvc, EICDataSvc, PodioOutput, GeoSvc
 
 from GaudiKernel.SystemOfUnits import eV, MeV, GeV, mm, cm, mrad
 
-import json
-
 detector_path = str(os.environ.get("DETECTOR_PATH", "."))
 detector_name = str(os.environ.get("DETECTOR_CONFIG", "epic"))
 detector_config = str(os.environ.get("DETECTOR_CONFIG", detector_name))
@@ -21,20 +27,7 @@ if "epic" in detector_name and "imaging" in detector_config:
 ci_ecal_sf = float(os.environ.get("CI_ECAL_SAMP_FRAC", 0.03))
 
 # input calorimeter DAQ info
-calo_daq = {}
-with open(
-    "{}/calibrations/calo_digi_default.json".format(detector_path)
-) as f:
-    calo_config = json.load(f)
-    ## add proper ADC capacity based on bit depth
-    for sys in calo_config:
-        cfg = calo_config[sys]
-        calo_daq[sys] = {
-            "dynamicRangeADC": eval(cfg["dynamicRange"]),
-            "capacityADC": 2 ** int(cfg["capacityBitsADC"]),
-            "pedestalMean": int(cfg["pedestalMean"]),
-            "pedestalSigma": float(cfg["pedestalSigma"]),
-        }
+calo_daq = reco_config.calo_daq(detector_path)
 print(calo_daq)
 
 # input and output
@@ -46,6 +39,8 @@ n_events = int(os.environ["JUGGLER_N_EVENTS"])
 
 # services
 services = []
+# auditor service, no auditors unless JUGGLER_PROFILE is set
+reco_profiling.configure(services, output_rec)
 # geometry service
 services.append(
     GeoSvc(
@@ -216,6 +211,9 @@ podout.outputCommands = [
 ] + ["drop " + c for c in sim_coll]
 algorithms.append(podout)
 
+# read only the input collections used by the algorithms
+podin.collections = reco_dataflow.prune_inputs(algorithms, sim_coll)
+
 ApplicationMgr(
     TopAlg=algorithms,
     EvtSel="NONE",
@@ -224,3 +222,5 @@ ApplicationMgr(
     OutputLevel=WARNING,
     AuditAlgorithms=True,
 )
+
+reco_config.report_setup_time(__file__)
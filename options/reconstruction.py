@@ -1,13 +1,19 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from reco_common import config as reco_config
+from reco_common import dataflow as reco_dataflow
+from reco_common import profiling as reco_profiling
+
 from Gaudi.Configuration import *
 
-from Configurables import ApplicationMgr, AuditorSvc, EICDataSvc, PodioOutput, GeoSvc
+from Configurables import ApplicationMgr, EICDataSvc, PodioOutput, GeoSvc
 from Configurables import Gaudi__Monitoring__MessageSvcSink as MessageSvcSink
 from Configurables import Gaudi__Histograming__Sink__Root as RootHistoSink
 from GaudiKernel import SystemOfUnits as units
 from GaudiKernel.SystemOfUnits import eV, MeV, GeV, mm, cm, mrad
 
-import json
-
 detector_path = str(os.environ.get("DETECTOR_PATH", "."))
 detector_name = str(os.environ.get("DETECTOR_CONFIG", "epic"))
 detector_config = str(os.environ.get("DETECTOR_CONFIG", detector_name))
@@ -24,34 +30,19 @@ else:
     ionBeamEnergy = 100
 
 # ZDC reconstruction calibrations
-try:
-    ffi_zdc_calibrations = "calibrations/ffi_zdc.json"
-    with open(os.path.join(detector_path, ffi_zdc_calibrations)) as f:
-        ffi_zdc_config = json.load(f)
-
-        def ffi_zdc_cal_parse(ffi_zdc_cal):
-            ffi_zdc_cal_sf = float(ffi_zdc_cal["sampling_fraction"])
-            ffi_zdc_cal_cl_kwargs = {
-                "minClusterCenterEdep": eval(ffi_zdc_cal["minClusterCenterEdep"]),
-                "minClusterHitEdep": eval(ffi_zdc_cal["minClusterHitEdep"]),
-                "localDistXY": [
-                    eval(ffi_zdc_cal["localDistXY"][0]),
-                    eval(ffi_zdc_cal["localDistXY"][1]),
-                ],
-                "splitCluster": bool(ffi_zdc_cal["splitCluster"]),
-            }
-            return ffi_zdc_cal_sf, ffi_zdc_cal_cl_kwargs
-
-        ffi_zdc_ecal_sf, ffi_zdc_ecal_cl_kwargs = ffi_zdc_cal_parse(
-            ffi_zdc_config["ffi_zdc_ecal"]
-        )
-        ffi_zdc_hcal_sf, ffi_zdc_hcal_cl_kwargs = ffi_zdc_cal_parse(
-            ffi_zdc_config["ffi_zdc_hcal"]
-        )
-except (IOError, OSError):
+ffi_zdc_calibrations = "calibrations/ffi_zdc.json"
+ffi_zdc_config = reco_config.ffi_zdc_calibration(detector_path)
+if ffi_zdc_config is not None:
+    ffi_zdc_ecal_sf = ffi_zdc_config["ffi_zdc_ecal"]["sampling_fraction"]
+    ffi_zdc_ecal_cl_kwargs = ffi_zdc_config["ffi_zdc_ecal"]["cluster_kwargs"]
+    ffi_zdc_hcal_sf = ffi_zdc_config["ffi_zdc_hcal"]["sampling_fraction"]
+    ffi_zdc_hcal_cl_kwargs = ffi_zdc_config["ffi_zdc_hcal"]["cluster_kwargs"]
+else:
     print(f"Using default ffi_zdc calibrations; {ffi_zdc_calibrations} not found.")
     ffi_zdc_ecal_sf = float(os.environ.get("FFI_ZDC_ECAL_SAMP_FRAC", 1.0))
     ffi_zdc_hcal_sf = float(os.environ.get("FFI_ZDC_HCAL_SAMP_FRAC", 1.0))
+    ffi_zdc_ecal_cl_kwargs = {}
+    ffi_zdc_hcal_cl_kwargs = {}
 
 # RICH reconstruction
 qe_data = [
@@ -67,24 +58,12 @@ ci_hcal_sf = float(os.environ.get("CI_HCAL_SAMP_FRAC", 0.025))
 ce_hcal_sf = float(os.environ.get("CE_HCAL_SAMP_FRAC", 0.025))
 
 # input arguments from calibration file
-with open(f"{detector_path}/calibrations/emcal_barrel_calibration.json") as f:
-    calib_data = json.load(f)["electron"]
+calib_data = reco_config.emcal_barrel_calibration(detector_path)
 
 print(calib_data)
 
 # input calorimeter DAQ info
-calo_daq = {}
-with open(f"{detector_path}/calibrations/calo_digi_default.json") as f:
-    calo_config = json.load(f)
-    ## add proper ADC capacity based on bit depth
-    for sys in calo_config:
-        cfg = calo_config[sys]
-        calo_daq[sys] = {
-            "dynamicRangeADC": eval(cfg["dynamicRange"]),
-            "capacityADC": 2 ** int(cfg["capacityBitsADC"]),
-            "pedestalMean": int(cfg["pedestalMean"]),
-            "pedestalSigma": float(cfg["pedestalSigma"]),
-        }
+calo_daq = reco_config.calo_daq(detector_path)
 print(calo_daq)
 
 img_barrel_sf = float(calib_data["sampling_fraction_img"])
@@ -99,8 +78,8 @@ n_events = int(os.environ["JUGGLER_N_EVENTS"])
 
 # services
 services = []
-# auditor service
-services.append(AuditorSvc("AuditorSvc", Auditors=["ChronoAuditor", "MemStatAuditor"]))
+# auditor service, JUGGLER_PROFILE overrides the default auditors
+reco_profiling.configure(services, output_rec, default=["chrono", "mem"])
 # geometry service
 ## note: old version of material map is called material-maps.XXX, new version is materials-map.XXX
 ##       these names are somewhat inconsistent, and should probably all be renamed to 'material-map.XXX'
@@ -1187,8 +1166,13 @@ incl_kin_esigma = InclusiveKinematicseSigma(
 algorithms.append(incl_kin_esigma)
 
 # Output
-podout = PodioOutput("out", filename=output_rec)
-podout.outputCommands = (
+# JUGGLER_OUTPUT_PROFILE selects the collections written to the output file:
+# - default:    the reconstructed objects without the hits and proto-clusters
+# - physics:    MCParticles, the particles, the inclusive kinematics, the clusters and the
+#               calorimeter hits read by scripts/plot_reco_endcap.py
+# - calo-debug: default, plus the calorimeter hits, proto-clusters and cluster associations
+# - full:       every collection, including the simulated ones
+default_output = (
     [
         "keep *",
         "drop *Hits",
@@ -1201,8 +1185,43 @@ podout.outputCommands = (
     + ["drop " + c for c in sim_coll]
     + ["keep MCParticles"]
 )
+output_profiles = {
+    "default": default_output,
+    "physics": [
+        "drop *",
+        "keep MCParticles",
+        "keep *Particles",
+        "keep *ParticlesAssoc",
+        "drop outputParticles",
+        "keep InclusiveKinematics*",
+        "keep *Clusters",
+        "drop *ProtoClusters",
+        # scripts/plot_reco_endcap.py, the *HitsReco names are those of older reconstruction files
+        "keep HcalEndcapPRecHits",
+        "keep EcalEndcapPHitsReco",
+        "keep HcalEndcapPHitsReco",
+    ],
+    "calo-debug": default_output
+    + ["keep {}*".format(calo) for calo in ["Ecal", "Hcal", "ZDC"]]
+    + ["drop " + c for c in sim_coll]
+    + ["keep MCParticles"],
+    "full": ["keep *"],
+}
+output_profile = os.environ.get("JUGGLER_OUTPUT_PROFILE", "default")
+if output_profile not in output_profiles:
+    raise ValueError(
+        "unknown JUGGLER_OUTPUT_PROFILE {}, available: {}".format(
+            output_profile, ", ".join(output_profiles)
+        )
+    )
+
+podout = PodioOutput("out", filename=output_rec)
+podout.outputCommands = output_profiles[output_profile]
 algorithms.append(podout)
 
+# read only the input collections used by the algorithms
+podin.collections = reco_dataflow.prune_inputs(algorithms, sim_coll)
+
 ApplicationMgr(
     TopAlg=algorithms,
     EvtSel="NONE",
@@ -1212,3 +1231,5 @@ ApplicationMgr(
     AuditAlgorithms=True,
     HistogramPersistency="ROOT",
 )
+
+reco_config.report_setup_time(__file__)
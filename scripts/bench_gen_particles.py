@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import tempfile
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from gen_particles import PARTICLES, FORMATS, WRITERS, gen_event, gen_kinematics, import_hepmc3
+
+
+def sample(nev, seed, particles):
+    rng = np.random.RandomState(seed)
+    parts = [PARTICLES[p.strip()] for p in particles.split(',')]
+    pvals = rng.uniform(8.0, 100.0, nev)
+    thvals = rng.uniform(0.0, 20.0, nev)/180.*np.pi
+    phivals = rng.uniform(0.0, 360.0, nev)/180.*np.pi
+    partidx = rng.choice(len(parts), nev)
+    pids = np.array([pid for pid, _ in parts])[partidx]
+    masses = np.array([mass for _, mass in parts], dtype=float)[partidx]
+    return pvals, thvals, phivals, pids, masses
+
+
+def run_per_event(path, pvals, thvals, phivals, pids, masses):
+    output = import_hepmc3().WriterAscii(path)
+    for p, theta, phi, pid, mass in zip(pvals, thvals, phivals, pids, masses):
+        evt = gen_event(p, theta, phi, int(pid), mass)
+        output.write_event(evt)
+        evt.clear()
+    output.close()
+
+
+def run_batch(path, pvals, thvals, phivals, pids, masses, batch, writer, **kwargs):
+    output = WRITERS[writer](path, **kwargs)
+    for start in range(0, len(pvals), batch):
+        sl = slice(start, start + batch)
+        ebeam, hout = gen_kinematics(pvals[sl], thvals[sl], phivals[sl], masses[sl])
+        output.write_batch(ebeam, hout, pids[sl])
+    output.close()
+
+
+def hepmc3_version(path):
+    with open(path) as f:
+        return f.readline().split()[-1]
+
+
+def bench_formats(vals, batch, tmp):
+    """
+    Write throughput and file size of each output format
+    """
+    results = []
+    for fmt in FORMATS.keys():
+        writer = 'hepmc3' if fmt == 'root' else 'ascii'
+        path = os.path.join(tmp, 'gen.' + fmt)
+        t0 = time.perf_counter()
+        try:
+            run_batch(path, *vals, batch, writer, fmt=fmt)
+        except ImportError as e:
+            print("skip format {}: {}".format(fmt, e))
+            continue
+        dt = time.perf_counter() - t0
+        results.append((fmt, dt, os.path.getsize(path)))
+
+    nev = len(vals[0])
+    print("{:<8s} {:>10s} {:>14s} {:>12s} {:>8s}".format('format', 'time (s)', 'events/s', 'size (MB)', 'ratio'))
+    for fmt, dt, size in results:
+        print("{:<8s} {:>10.3f} {:>14.0f} {:>12.2f} {:>8.3f}".format(
+              fmt, dt, nev/dt, size/1024./1024., size/results[0][2]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the event generation speed of gen_particles.py')
+    parser.add_argument('-n', type=int, default=100000, dest='nev', help='number of events to generate')
+    parser.add_argument('-s', type=int, default=12345, dest='seed', help='seed for random generator')
+    parser.add_argument('--batch', type=int, default=10000, dest='batch', help='number of events per batch')
+    parser.add_argument('--particles', type=str, default='pi+,e-', dest='particles', help='particle names')
+    parser.add_argument('--formats', action='store_true', default=False, dest='formats',
+                        help='benchmark the write throughput and file size of the output formats')
+    args = parser.parse_args()
+
+    vals = sample(args.nev, args.seed, args.particles)
+    if args.formats:
+        with tempfile.TemporaryDirectory() as tmp:
+            bench_formats(vals, args.batch, tmp)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+
+        def run(name, func, *extra, **kwargs):
+            path = os.path.join(tmp, name + '.hepmc')
+            t0 = time.perf_counter()
+            func(path, *vals, *extra, **kwargs)
+            dt = time.perf_counter() - t0
+            with open(path, 'rb') as f:
+                results.append((name, dt, f.read()))
+
+        run('per-event', run_per_event)
+        run('batch', run_batch, args.batch, 'hepmc3')
+        # the header of the direct output should carry the same HepMC3 version as the reference
+        version = hepmc3_version(os.path.join(tmp, 'per-event.hepmc'))
+        run('ascii', run_batch, args.batch, 'ascii', version=version)
+
+    print("{:<12s} {:>10s} {:>14s} {:>8s} {:>10s}".format('mode', 'time (s)', 'events/s', 'speedup', 'identical'))
+    for name, dt, data in results:
+        print("{:<12s} {:>10.3f} {:>14.0f} {:>8.2f} {:>10s}".format(
+              name, dt, args.nev/dt, results[0][1]/dt, str(data == results[0][2])))
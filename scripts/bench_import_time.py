@@ -0,0 +1,56 @@
+import os
+import sys
+import argparse
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# (script, arguments) of the startup paths to check, relative to the repository
+TARGETS = [
+    ("scripts/plot_reco_endcap.py", ["--help"]),
+    ("benchmarks/dis/analysis/kinematics_correlations.py", ["--help"]),
+    ("benchmarks/dis/analysis/kinematics_correlations.py", ["merge", "--help"]),
+]
+# modules that must not be imported by these startup paths
+HEAVY_MODULES = ["uproot", "awkward", "scipy", "matplotlib", "mplhep"]
+
+
+def import_times(script, script_args):
+    """
+    Total import time (us) and the cumulative time of each top-level module, from python -X importtime
+    """
+    res = subprocess.run([sys.executable, "-X", "importtime", script] + script_args, cwd=REPO_DIR,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    modules = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nested imports are indented, only the top-level ones add up to the total
+        if not name.startswith("  "):
+            modules[name.strip()] = int(cumulative)
+    return sum(modules.values()), modules
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the startup import time of the analysis scripts')
+    parser.add_argument('-r', type=int, default=5, dest='repeat', help='number of runs, the best one is reported')
+    parser.add_argument('--max-ms', type=float, default=300., dest='max_ms',
+                        help='fail if the import time of a startup path exceeds this threshold (ms)')
+    parser.add_argument('--top', type=int, default=5, dest='top', help='number of slowest modules to list')
+    args = parser.parse_args()
+
+    failed = False
+    print("{:<70s} {:>10s} {:>8s}".format('startup path', 'time (ms)', 'status'))
+    for script, script_args in TARGETS:
+        runs = [import_times(script, script_args) for _ in range(args.repeat)]
+        total, modules = min(runs, key=lambda run: run[0])
+        heavy = sorted(name for name in modules if name.split('.')[0] in HEAVY_MODULES)
+        ok = total/1000. <= args.max_ms and not heavy
+        failed |= not ok
+        print("{:<70s} {:>10.1f} {:>8s}".format(" ".join([script] + script_args), total/1000., 'ok' if ok else 'FAIL'))
+        for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+            print("    {:<66s} {:>10.1f}".format(name, cumulative/1000.))
+        if heavy:
+            print("    heavy modules imported: {}".format(", ".join(heavy)))
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import tempfile
+import argparse
+import numpy as np
+import uproot as ur
+import awkward as ak
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from plot_reco_endcap import ECAL_EFF_COLLECTIONS, efficiency_hists
+
+
+def make_file(path, nev, seed):
+    """
+    Synthetic reconstruction output with the endcap cluster branches used by plot_ecal_efficiency
+    """
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(1.5, nev)
+    ncl = counts.sum()
+    branches = {}
+    for coll in ECAL_EFF_COLLECTIONS:
+        branches[coll+".energy"] = ak.unflatten(rng.exponential(0.4, ncl).astype(np.float32), counts)
+        branches[coll+".eta"] = ak.unflatten(rng.uniform(0.9, 3.6, ncl).astype(np.float32), counts)
+        branches[coll+".whits"] = ak.unflatten(rng.integers(1, 25, ncl).astype(np.uint32), counts)
+    with ur.recreate(path) as f:
+        f["events"] = branches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the parallel file reading of plot_reco_endcap.py')
+    parser.add_argument('-n', type=int, default=8, dest='n_file', help='number of truth and reco files')
+    parser.add_argument('-e', type=int, default=100000, dest='nev', help='number of events per file')
+    parser.add_argument('--jobs', type=str, default='1,2,4,8', dest='jobs', help='numbers of processes to compare')
+    parser.add_argument('--step-size', type=int, default=None, dest='step_size', help='entries per chunk')
+    args = parser.parse_args()
+
+    min_ene = np.arange(0.1, 0.95, 0.1)
+    eff_bins = np.arange(1.05, 3.5, 0.1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_lists = []
+        for tag, seed in [('tru', 0), ('rec', 1)]:
+            files = []
+            for proc in range(args.n_file):
+                path = os.path.join(tmp, tag + str(proc) + '.root')
+                make_file(path, args.nev, seed*args.n_file + proc)
+                files.append(path + ':events')
+            file_lists.append(files)
+
+        results = []
+        for jobs in [int(j) for j in args.jobs.split(',')]:
+            t0 = time.perf_counter()
+            hists = efficiency_hists(file_lists, min_ene, eff_bins, args.step_size, jobs)
+            dt = time.perf_counter() - t0
+            results.append((jobs, dt, hists))
+
+    print("{:>6s} {:>10s} {:>14s} {:>8s} {:>10s}".format('jobs', 'time (s)', 'files/s', 'speedup', 'identical'))
+    for jobs, dt, hists in results:
+        identical = all((h[key] == r[key]).all() for h, r in zip(hists, results[0][2]) for key in h)
+        print("{:>6d} {:>10.3f} {:>14.2f} {:>8.2f} {:>10s}".format(
+              jobs, dt, 2*args.n_file/dt, results[0][1]/dt, str(identical)))
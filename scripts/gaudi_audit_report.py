@@ -0,0 +1,214 @@
+import re
+import sys
+import json
+import argparse
+
+# per-algorithm reports of the AuditorSvc in a gaudirun.py log:
+# - ChronoAuditor, through the Chrono table of the ChronoStatSvc at finalize, one line per "algorithm:phase" tag,
+#   printed as the message source, e.g.
+#   ci_ecal_digi:execute   INFO Time User   : Tot= 1.23  [s]  Ave/Min/Max= 12.3(+- 1.1)/ 10.2/ 25.1  [ms] #=100
+#   the MessageSvc cuts the source to its width (18 by default) with a "..." suffix, e.g. "trk_find_alg:ex...",
+#   JUGGLER_PROFILE (options/reco_common/profiling.py) widens it
+# - MemStatAuditor, through the "algorithm:VMem" (memory delta) and "algorithm:RMemUsage" (resident set size)
+#   counters in the Stat table of the ChronoStatSvc at finalize, e.g.
+#    | "ci_ecal_digi:VMem"   |       200 |     12.5 |   0.0625 |  0.21 |    0 |   2.5 |
+#   and, in older Gaudi versions, one line per algorithm call, e.g.
+#   MemStatAuditor   INFO Memory: ci_ecal_digi:execute Virtual size = 1234.5 MB ~ Resident set size = 678.9 MB
+NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+CHRONO_RE = re.compile(
+    r'^\s*(?P<source>\S+)\s+(?:\w+\s+)?Time User\s*:\s*Tot=\s*(?P<total>{0})\s*\[(?P<total_unit>\w+)\]'
+    r'(?:\s*Ave/Min/Max=\s*(?P<mean>{0})\s*\(\+-\s*(?P<rms>{0})\)\s*/\s*(?P<min>{0})\s*/\s*(?P<max>{0})'
+    r'\s*\[(?P<unit>\w+)\])?\s*#=\s*(?P<calls>\d+)'.format(NUMBER))
+MEMSTAT_RE = re.compile(
+    r'(?P<name>[\w.]+)[: ](?P<phase>initialize|execute|finalize)\W+virtual size\s*=\s*(?P<vsize>{0})\s*MB'
+    r'\W+resident set size\s*=\s*(?P<rss>{0})\s*MB'.format(NUMBER), re.IGNORECASE)
+STAT_ROW_RE = re.compile(
+    r'^\s*\|?\s*"?(?P<counter>[\w.:]+)"?\s*\|\s*(?P<entries>\d+)\s*\|\s*(?P<sum>{0})\s*\|\s*(?P<mean>{0})\s*\|'
+    r'\s*(?P<rms>{0})\s*\|\s*(?P<min>{0})\s*\|\s*(?P<max>{0})\s*\|'.format(NUMBER))
+TIME_UNITS = {'ns': 1e-9, 'us': 1e-6, 'ms': 1e-3, 's': 1., 'min': 60., 'hr': 3600.}
+PHASES = ['initialize', 'reinitialize', 'start', 'execute', 'stop', 'finalize', 'restart']
+MEM_COUNTERS = ['VMem', 'RMemUsage']
+TRUNCATION = '...'
+
+
+def split_tag(tag):
+    """
+    (name, phase) of a ChronoAuditor "name:phase" tag, the phase is None if it is not a tag or was cut before the
+    name ends
+    """
+    truncated = tag.endswith(TRUNCATION)
+    if truncated:
+        tag = tag[:-len(TRUNCATION)]
+    name, sep, phase = tag.rpartition(':')
+    if not sep:
+        return tag, None
+    if truncated:
+        # a cut phase is resolved if it is the start of a single phase name
+        phases = [p for p in PHASES if p.startswith(phase)]
+        phase = phases[0] if len(phases) == 1 else None
+    return name, phase
+
+
+def parse_log(lines, unresolved=None):
+    """
+    Per-algorithm CPU time (s) of the execute calls and memory deltas (MB) from the lines of a gaudirun.py log
+
+    The memory delta of a call is the change of the virtual size since the previous MemStatAuditor line, or the
+    mean of the VMem counter. The chrono tags cut by the message source width which cannot be attributed to an
+    algorithm and phase are appended to unresolved, if given.
+    """
+    algorithms = {}
+
+    def entry(name):
+        return algorithms.setdefault(name, {'name': name, 'calls': 0, 'cpu_total': 0., 'cpu_mean': 0., 'cpu_rms': 0.,
+                                            'cpu_min': 0., 'cpu_max': 0., 'cpu_initialize': 0., 'mem_calls': 0,
+                                            'mem_delta_total': 0., 'mem_delta_mean': 0., 'rss_max': 0.})
+
+    last_vsize = None
+    for line in lines:
+        match = CHRONO_RE.search(line)
+        if match:
+            name, phase = split_tag(match.group('source'))
+            if phase is None:
+                # e.g. the total time of the job, with the ChronoStatSvc as source
+                if match.group('source').endswith(TRUNCATION) and unresolved is not None:
+                    unresolved.append(match.group('source'))
+                continue
+            total = float(match.group('total'))*TIME_UNITS[match.group('total_unit')]
+            if phase == 'initialize':
+                entry(name)['cpu_initialize'] = total
+            elif phase == 'execute':
+                alg = entry(name)
+                alg['calls'] = int(match.group('calls'))
+                alg['cpu_total'] = total
+                if match.group('mean') is not None:
+                    unit = TIME_UNITS[match.group('unit')]
+                    for key in ['mean', 'rms', 'min', 'max']:
+                        alg['cpu_' + key] = float(match.group(key))*unit
+                else:
+                    alg['cpu_mean'] = alg['cpu_min'] = alg['cpu_max'] = total/max(alg['calls'], 1)
+            continue
+        match = MEMSTAT_RE.search(line)
+        if match:
+            name, phase = match.group('name'), match.group('phase').lower()
+            vsize = float(match.group('vsize'))
+            if phase == 'execute':
+                alg = entry(name)
+                alg['mem_calls'] += 1
+                alg['mem_delta_total'] += vsize - last_vsize if last_vsize is not None else 0.
+                alg['mem_delta_mean'] = alg['mem_delta_total']/alg['mem_calls']
+                alg['rss_max'] = max(alg['rss_max'], float(match.group('rss')))
+            last_vsize = vsize
+            continue
+        match = STAT_ROW_RE.search(line)
+        if match:
+            name, _, counter = match.group('counter').rpartition(':')
+            if counter not in MEM_COUNTERS or not name:
+                continue
+            # counters per phase ("name:execute:VMem"), or per algorithm ("name:VMem"), dominated by the execute calls
+            prefix, _, phase = name.rpartition(':')
+            if phase in PHASES:
+                if phase != 'execute':
+                    continue
+                name = prefix
+            alg = entry(name)
+            if counter == 'VMem':
+                alg['mem_calls'] = int(match.group('entries'))
+                alg['mem_delta_total'] = float(match.group('sum'))
+                alg['mem_delta_mean'] = float(match.group('mean'))
+            else:
+                alg['rss_max'] = float(match.group('max'))
+
+    return sorted(algorithms.values(), key=lambda alg: -alg['cpu_total'])
+
+
+def compare(algorithms, baseline, threshold):
+    """
+    Ratio of the mean execute CPU time to the baseline, and whether it exceeds threshold, for each algorithm
+    """
+    reference = {alg['name']: alg for alg in baseline['algorithms']}
+    for alg in algorithms:
+        ref = reference.get(alg['name'])
+        if ref is None or ref['cpu_mean'] <= 0:
+            alg['baseline_ratio'] = None
+            alg['regression'] = False
+            continue
+        alg['baseline_ratio'] = alg['cpu_mean']/ref['cpu_mean']
+        alg['regression'] = alg['baseline_ratio'] > threshold
+
+
+def markdown(report):
+    """
+    Markdown table of the algorithms ranked by total CPU time, the hot spots are in bold
+    """
+    with_baseline = report['baseline'] is not None
+    header = ['rank', 'algorithm', 'calls', 'CPU total (s)', 'CPU mean (ms)', 'CPU share', 'mem delta total (MB)',
+              'mem delta mean (MB)', 'RSS max (MB)'] + (['vs baseline'] if with_baseline else [])
+    rows = ['| ' + ' | '.join(header) + ' |', '|' + '---|'*len(header)]
+    for rank, alg in enumerate(report['algorithms'], 1):
+        name = '**{}**'.format(alg['name']) if alg['name'] in report['hot_spots'] else alg['name']
+        cells = [str(rank), name, str(alg['calls']), '{:.3f}'.format(alg['cpu_total']),
+                 '{:.3f}'.format(alg['cpu_mean']*1e3), '{:.1%}'.format(alg['cpu_share']),
+                 '{:.1f}'.format(alg['mem_delta_total']), '{:.3f}'.format(alg['mem_delta_mean']),
+                 '{:.1f}'.format(alg['rss_max'])]
+        if with_baseline:
+            ratio = alg.get('baseline_ratio')
+            cells.append('-' if ratio is None else '{:.2f}{}'.format(ratio, ' (regression)' if alg['regression'] else ''))
+        rows.append('| ' + ' | '.join(cells) + ' |')
+    return '\n'.join(rows) + '\n'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Per-algorithm CPU time and memory report from the ChronoAuditor/MemStatAuditor output of a '
+                    'gaudirun.py log')
+    parser.add_argument('log', help='gaudirun.py log file ("-" for stdin).')
+    parser.add_argument('--json', dest='json_out', default=None, help='Output JSON report.')
+    parser.add_argument('--markdown', dest='md_out', default=None, help='Output markdown table (default: stdout).')
+    parser.add_argument('--top', type=int, default=5, help='Number of hot spots, ranked by total CPU time.')
+    parser.add_argument('--baseline', default=None, help='JSON report of a reference run to compare with.')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Flag a regression if the mean CPU time exceeds the baseline by this factor.')
+    args = parser.parse_args()
+
+    unresolved = []
+    if args.log == '-':
+        algorithms = parse_log(sys.stdin, unresolved)
+    else:
+        with open(args.log, errors='replace') as f:
+            algorithms = parse_log(f, unresolved)
+    if unresolved:
+        print('WARNING: {} chrono tags cut by the message source width are not in the report: {}. Run with '
+              'JUGGLER_PROFILE=chrono, which widens the source column'.format(len(unresolved), ', '.join(unresolved)),
+              file=sys.stderr)
+    if not algorithms:
+        sys.exit('No ChronoAuditor or MemStatAuditor output found in {}'.format(args.log))
+
+    cpu_total = sum(alg['cpu_total'] for alg in algorithms)
+    for alg in algorithms:
+        alg['cpu_share'] = alg['cpu_total']/cpu_total if cpu_total > 0 else 0.
+    report = {
+        'log': args.log,
+        'cpu_total': cpu_total,
+        'algorithms': algorithms,
+        'hot_spots': [alg['name'] for alg in algorithms[:args.top]],
+        'baseline': args.baseline,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(algorithms, json.load(f), args.threshold)
+        report['regressions'] = [alg['name'] for alg in algorithms if alg['name'] in report['hot_spots']
+                                 and alg['regression']]
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.md_out:
+        with open(args.md_out, 'w') as f:
+            f.write(markdown(report))
+    else:
+        print(markdown(report), end='')
+
+    if report.get('regressions'):
+        print('Hot spots slower than the baseline (x{}): {}'.format(args.threshold, ', '.join(report['regressions'])))
+        sys.exit(1)
@@ -1,7 +1,29 @@
+import io
 import os
-from pyHepMC3 import HepMC3 as hm
+import sys
 import numpy as np
 import argparse
+import itertools
+import multiprocessing
+import importlib.util
+
+
+# version tag written in the header of the direct ASCII output, should follow the HepMC3 installation
+HEPMC3_VERSION = "3.02.05"
+
+# pyHepMC3 is only imported when the event objects are needed (see import_hepmc3)
+hm = None
+
+# output formats, deduced from the file extension if not specified
+FORMATS = {
+    'hepmc': 'plain HepMC3 ASCII',
+    'gz': 'gzip compressed HepMC3 ASCII',
+    'zst': 'zstd compressed HepMC3 ASCII (requires zstandard)',
+    'root': 'HepMC3 ROOT tree (requires pyHepMC3.rootIO)',
+}
+COMPRESSED_FORMATS = {'.gz': 'gz', '.zst': 'zst'}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
 
 
 PARTICLES = {
@@ -21,7 +43,16 @@ PARTICLES = {
 }
 
 
+def import_hepmc3():
+    global hm
+    if hm is None:
+        from pyHepMC3 import HepMC3
+        hm = HepMC3
+    return hm
+
+
 def gen_event(p, theta, phi, pid, mass):
+    hm = import_hepmc3()
     evt = hm.GenEvent(momentum_unit=hm.Units.MomentumUnit.GEV, length_unit=hm.Units.LengthUnit.MM)
     # final state
     state = 1
@@ -46,11 +77,287 @@ def gen_event(p, theta, phi, pid, mass):
     return evt
 
 
+def gen_kinematics(p, theta, phi, mass):
+    """
+    Compute the four-momenta of a batch of events with array operations
+    returns (ebeam, hout), each is an array of shape (n, 4) with columns (px, py, pz, e)
+    """
+    e0 = np.sqrt(p*p + mass*mass)
+    px = np.cos(phi)*np.sin(theta)
+    py = np.sin(phi)*np.sin(theta)
+    pz = np.cos(theta)
+
+    zeros = np.zeros_like(e0)
+    ebeam = np.column_stack([zeros, zeros, e0, np.sqrt(e0*e0 + 0.511e-3*0.511e-3)])
+    hout = np.column_stack([px*p, py*p, pz*p, e0])
+    return ebeam, hout
+
+
+def gen_events(p, theta, phi, pid, mass):
+    """
+    Generate a batch of events, the same topology as gen_event()
+    all the kinematics are computed up front, pyHepMC3 is only used to fill the event records
+    """
+    ebeam, hout = gen_kinematics(p, theta, phi, mass)
+    return fill_events(ebeam, hout, pid)
+
+
+def fill_events(ebeam, hout, pid, event_number=0):
+    hm = import_hepmc3()
+    for eb, ho, hid in zip(ebeam.tolist(), hout.tolist(), pid.tolist()):
+        evt = hm.GenEvent(momentum_unit=hm.Units.MomentumUnit.GEV, length_unit=hm.Units.LengthUnit.MM)
+        evt.set_event_number(event_number)
+        vert = hm.GenVertex()
+        vert.add_particle_in(hm.GenParticle(hm.FourVector(*eb), 11, 4))
+        vert.add_particle_in(hm.GenParticle(hm.FourVector(0, 0, 0, 0.938272), 2212, 4))
+        vert.add_particle_out(hm.GenParticle(hm.FourVector(*ho), hid, 1))
+        evt.add_vertex(vert)
+        yield evt
+
+
+def four_vector_mass(v):
+    """
+    Invariant masses of an array of (px, py, pz, e), evaluated as HepMC3::FourVector::m()
+    so the values written are the same as the generated masses from pyHepMC3
+    """
+    m2 = v[:, 3]*v[:, 3] - ((v[:, 0]*v[:, 0] + v[:, 1]*v[:, 1]) + v[:, 2]*v[:, 2])
+    return np.where(m2 < 0., -np.sqrt(np.abs(m2)), np.sqrt(np.abs(m2)))
+
+
+# HepMC3 ASCII records of one event, the proton beam at rest is the same for every event
+PBEAM = np.array([[0., 0., 0., 0.938272]])
+ASCII_EVENT_FORMAT = ("E %d 1 3\n"
+                      "U GEV MM\n"
+                      "P 1 0 11 %.16e %.16e %.16e %.16e %.16e 4\n"
+                      "P 2 0 2212 {pbeam} 4\n"
+                      "V -1 0 [1,2]\n"
+                      "P 3 -1 %d %.16e %.16e %.16e %.16e %.16e 1\n").format(
+    pbeam=' '.join('{:.16e}'.format(v) for v in np.column_stack([PBEAM, four_vector_mass(PBEAM)])[0]))
+
+
+def format_events(ebeam, hout, pid, event_number=0):
+    """
+    Format the HepMC3 ASCII records of a batch of 1-vertex, 3-particle events
+    """
+    rows = np.column_stack([np.full(len(pid), event_number), ebeam, four_vector_mass(ebeam),
+                            pid, hout, four_vector_mass(hout)])
+    return ''.join([ASCII_EVENT_FORMAT % tuple(row) for row in rows.tolist()])
+
+
+def module_available(name):
+    """
+    Whether a module can be imported, without importing it (its parent packages are imported)
+    """
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+
+def deduce_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.root':
+        return 'root'
+    return COMPRESSED_FORMATS.get(ext, 'hepmc')
+
+
+def open_text(path, fmt='hepmc', buffering=16*1024*1024):
+    """
+    Open a text file for writing, the compressed formats are streamed through the compressor
+    """
+    if fmt == 'gz':
+        import gzip
+        raw = gzip.open(path, 'wb', compresslevel=GZIP_LEVEL)
+    elif fmt == 'zst':
+        import zstandard
+        raw = zstandard.open(path, 'wb', cctx=zstandard.ZstdCompressor(level=ZSTD_LEVEL))
+    else:
+        return open(path, 'w', buffering=buffering)
+    return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size=buffering))
+
+
+class HepMC3Writer:
+    """
+    Write the events through the pyHepMC3 object graph, with hm.WriterAscii or WriterRootTree (root format)
+    """
+    def __init__(self, path, fmt='hepmc'):
+        if fmt == 'root':
+            from pyHepMC3.rootIO import HepMC3 as hmrootIO
+            self.output = hmrootIO.WriterRootTree(path)
+        elif fmt == 'hepmc':
+            self.output = import_hepmc3().WriterAscii(path)
+        else:
+            raise ValueError('format {} is not supported by pyHepMC3 writer'.format(fmt))
+
+    def failed(self):
+        return self.output.failed()
+
+    def write_event(self, evt):
+        self.output.write_event(evt)
+
+    def write_batch(self, ebeam, hout, pid, event_number=0):
+        for evt in fill_events(ebeam, hout, pid, event_number):
+            self.output.write_event(evt)
+            evt.clear()
+
+    def close(self):
+        self.output.close()
+
+
+class AsciiWriter:
+    """
+    Write the HepMC3 ASCII records directly from the kinematics arrays
+    the output is byte-identical to hm.WriterAscii (with the same HepMC3 version in the header)
+    """
+    def __init__(self, path, fmt='hepmc', version=HEPMC3_VERSION, buffering=16*1024*1024):
+        if fmt not in ['hepmc'] + list(COMPRESSED_FORMATS.values()):
+            raise ValueError('format {} is not supported by ascii writer'.format(fmt))
+        try:
+            self.output = open_text(path, fmt, buffering)
+        except OSError:
+            self.output = None
+            return
+        self.output.write("HepMC::Version {}\nHepMC::Asciiv3-START_EVENT_LISTING\n".format(version))
+
+    def failed(self):
+        return self.output is None
+
+    def write_batch(self, ebeam, hout, pid, event_number=0):
+        self.output.write(format_events(ebeam, hout, pid, event_number))
+
+    def write_records(self, records):
+        self.output.write(records)
+
+    def close(self):
+        self.output.write("HepMC::Asciiv3-END_EVENT_LISTING\n\n")
+        self.output.close()
+
+
+WRITERS = {
+    'ascii': AsciiWriter,
+    'hepmc3': HepMC3Writer,
+}
+
+
+def sample_events(rng, nev, args, parts):
+    """
+    Sample the momenta, angles and particle types of nev events from a numpy.random.Generator
+    """
+    # p values
+    pvals = rng.uniform(args.pmin, args.pmax, nev) if not args.parray else \
+            rng.choice([float(p.strip()) for p in args.parray.split(',')], nev)
+    thvals = rng.uniform(args.angmin, args.angmax, nev)/180.*np.pi
+    phivals = rng.uniform(args.phmin, args.phmax, nev)/180.*np.pi
+    partidx = rng.choice(len(parts), nev)
+    pids = np.array([pid for pid, _ in parts])[partidx]
+    masses = np.array([mass for _, mass in parts], dtype=float)[partidx]
+    return pvals, thvals, phivals, pids, masses
+
+
+def gen_batches(pvals, thvals, phivals, pids, masses, batch):
+    for start in range(0, len(pvals), batch):
+        sl = slice(start, start + batch)
+        ebeam, hout = gen_kinematics(pvals[sl], thvals[sl], phivals[sl], masses[sl])
+        yield ebeam, hout, pids[sl]
+
+
+def write_shard(output, rng, nev, args, parts, event_number=0):
+    """
+    Generate nev events from rng and write them to an opened output
+    """
+    pvals, thvals, phivals, pids, masses = sample_events(rng, nev, args, parts)
+    if args.batch > 0:
+        for ebeam, hout, pid in gen_batches(pvals, thvals, phivals, pids, masses, args.batch):
+            output.write_batch(ebeam, hout, pid, event_number)
+    else:
+        for p, theta, phi, pid, mass in zip(pvals, thvals, phivals, pids.tolist(), masses):
+            evt = gen_event(p, theta, phi, pid, mass)
+            evt.set_event_number(event_number)
+            output.write_event(evt)
+            evt.clear()
+
+
+def shard_seeds(seed_seq, nev, shard_size):
+    """
+    Split nev events into shards, every shard has an independent random stream spawned from seed_seq
+    returns a list of (number of events, SeedSequence)
+    """
+    nshards = max(1, -(-nev // shard_size))
+    return [(min(shard_size, nev - i*shard_size), ss) for i, ss in enumerate(seed_seq.spawn(nshards))]
+
+
+def gen_task(task):
+    """
+    Generate the shards of a task, task is (shards, path, args, parts, event_number)
+    the events are written to a file if a path is given, otherwise their ASCII records are returned
+    """
+    shards, path, args, parts, event_number = task
+    if path is None:
+        records = []
+        for nev, ss in shards:
+            vals = sample_events(np.random.default_rng(ss), nev, args, parts)
+            records += [format_events(*b, event_number) for b in gen_batches(*vals, args.batch)]
+        return ''.join(records)
+
+    output = WRITERS[args.writer](path, args.format)
+    if output.failed():
+        return None
+    for nev, ss in shards:
+        write_shard(output, np.random.default_rng(ss), nev, args, parts, event_number)
+    output.close()
+    return path
+
+
+def run_tasks(tasks, workers):
+    """
+    Run the generation tasks in a process pool if workers > 1, the results are returned in order
+    """
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            yield from pool.imap(gen_task, tasks)
+    else:
+        yield from map(gen_task, tasks)
+
+
+def grid_points(args, parts):
+    """
+    Points of the particle x energy x angle scan, as (tag, args, parts) with the sampling fixed to the point
+    a dimension without grid values keeps the sampling from --particles, --pmin/--pmax/--parray or --angmin/--angmax
+    """
+    particles = [p.strip() for p in args.grid_particles.split(',')] if args.grid_particles else [None]
+    energies = [e.strip() for e in args.grid_energies.split(',')] if args.grid_energies else [None]
+    angles = [a.strip() for a in args.grid_angles.split(',')] if args.grid_angles else [None]
+
+    points = []
+    for particle, energy, angle in itertools.product(particles, energies, angles):
+        pargs = argparse.Namespace(**vars(args))
+        pparts = parts if particle is None else [PARTICLES[particle]]
+        if energy is not None:
+            pargs.parray = energy
+        if angle is not None:
+            pargs.angmin = pargs.angmax = float(angle)
+        points.append((dict(particle=particle, energy=energy, angle=angle), pargs, pparts))
+    return points
+
+
+def shard_path(path, ishard):
+    """
+    Numbered shard file, e.g., gen.hepmc -> gen-3.hepmc, gen.hepmc.gz -> gen-3.hepmc.gz
+    """
+    root, ext = os.path.splitext(path)
+    if ext.lower() in COMPRESSED_FORMATS:
+        root, ext2 = os.path.splitext(root)
+        ext = ext2 + ext
+    return "{}-{}{}".format(root, ishard, ext)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
-    parser.add_argument('output', help='path to the output file')
-    parser.add_argument('-n', type=int, default=1000, dest='nev', help='number of events to generate')
+    parser.add_argument('output', help='path to the output file, in the grid mode it can be a template with '
+                                       '{particle}, {energy} and {angle} to write one file per grid point')
+    parser.add_argument('-n', type=int, default=1000, dest='nev',
+                        help='number of events to generate (per grid point in the grid mode)')
     parser.add_argument('-s', type=int, default=-1, dest='seed', help='seed for random generator')
     parser.add_argument('--parray', type=str, default="", dest='parray',
                         help='an array of momenta in GeV, separated by \",\"')
@@ -62,45 +369,114 @@ if __name__ == "__main__":
     parser.add_argument('--phmax', type=float, default=360.0, dest='phmax', help='maximum angle in degree')
     parser.add_argument('--particles', type=str, default='electron', dest='particles',
                         help='particle names, support {}'.format(list(PARTICLES.keys())))
+    parser.add_argument('--batch', type=int, default=10000, dest='batch',
+                        help='number of events per vectorized batch, 0 to build events one by one with pyHepMC3')
+    parser.add_argument('--writer', type=str, default='ascii', dest='writer', choices=list(WRITERS.keys()),
+                        help='output backend, \"ascii\" formats the records directly, '
+                             '\"hepmc3\" goes through the pyHepMC3 objects')
+    parser.add_argument('--format', type=str, default='auto', dest='format', choices=['auto'] + list(FORMATS.keys()),
+                        help='output format, deduced from the file extension (.gz, .zst, .root) by default; '
+                             + ', '.join('{}: {}'.format(k, v) for k, v in FORMATS.items()))
+    parser.add_argument('--workers', type=int, default=1, dest='workers',
+                        help='number of processes generating the shards in parallel')
+    parser.add_argument('--shard-size', type=int, default=100000, dest='shard_size',
+                        help='number of events per shard, each shard has an independent random stream')
+    parser.add_argument('--split', action='store_true', default=False, dest='split',
+                        help='write the shards to numbered files (e.g., gen-0.hepmc, gen-1.hepmc, ...)')
+    parser.add_argument('--grid-particles', type=str, default='', dest='grid_particles',
+                        help='grid mode, particle names of the scan, separated by \",\"')
+    parser.add_argument('--grid-energies', type=str, default='', dest='grid_energies',
+                        help='grid mode, momenta in GeV of the scan, separated by \",\"')
+    parser.add_argument('--grid-angles', type=str, default='', dest='grid_angles',
+                        help='grid mode, angles in degree of the scan, separated by \",\"')
 
     args = parser.parse_args()
+    grid = bool(args.grid_particles or args.grid_energies or args.grid_angles)
+    # one file per grid point if the output is a template
+    grid_files = grid and '{' in args.output
+    if args.format == 'auto':
+        args.format = deduce_format(args.output)
+    if args.batch <= 0 or args.format == 'root':
+        args.writer = 'hepmc3'
+    if args.writer == 'hepmc3' and args.format != 'hepmc' and args.format != 'root':
+        parser.error('{} output requires --writer ascii and --batch > 0'.format(args.format))
+    if args.workers > 1 and not (args.split or grid_files) and args.writer != 'ascii':
+        parser.error('concatenated output from multiple workers requires --writer ascii and --batch > 0, '
+                     'or --split')
+    if grid and args.split:
+        parser.error('--split cannot be used in the grid mode, use an output template instead')
+    if args.shard_size <= 0:
+        parser.error('--shard-size must be a positive number of events')
+    if args.format == 'zst' and not module_available('zstandard'):
+        parser.error('zst output requires the zstandard module')
+    if args.format == 'root' and not module_available('pyHepMC3.rootIO'):
+        parser.error('root output requires pyHepMC3.rootIO')
+    for pid in args.grid_particles.split(',') if args.grid_particles else []:
+        if pid.strip() not in PARTICLES.keys():
+            parser.error('grid particle {} not found in dictionary'.format(pid.strip()))
 
     # random seed (< 0 will get it from enviroment variable 'SEED', or a system random number)
     if args.seed < 0:
-        args.seed = os.environ.get('SEED', int.from_bytes(os.urandom(4), byteorder='big', signed=False))
+        args.seed = int(os.environ.get('SEED', int.from_bytes(os.urandom(4), byteorder='big', signed=False)))
     print("Random seed is {}".format(args.seed))
-    np.random.seed(args.seed)
-
-    output = hm.WriterAscii(args.output);
-    if output.failed():
-        print("Cannot open file \"{}\"".format(args.output))
-        sys.exit(2)
 
     # build particle info
     parts = []
     for pid in args.particles.split(','):
         pid = pid.strip()
         if pid not in PARTICLES.keys():
-            print('pid {:d} not found in dictionary, ignored.'.format(pid))
+            print('pid {} not found in dictionary, ignored.'.format(pid))
             continue
         parts.append(PARTICLES[pid])
 
-    # p values
-    pvals = np.random.uniform(args.pmin, args.pmax, args.nev) if not args.parray else \
-            np.random.choice([float(p.strip()) for p in args.parray.split(',')], args.nev)
-    thvals = np.random.uniform(args.angmin, args.angmax, args.nev)/180.*np.pi
-    phivals = np.random.uniform(args.phmin, args.phmax, args.nev)/180.*np.pi
-    partvals = [parts[i] for i in np.random.choice(len(parts), args.nev)]
-
-    count = 0
-    for p, theta, phi, (pid, mass) in zip(pvals, thvals, phivals, partvals):
-        if (count % 1000 == 0):
-            print("Generated {} events".format(count), end='\r')
-        evt = gen_event(p, theta, phi, pid, mass)
-        output.write_event(evt)
-        evt.clear()
-        count += 1
-
-    print("Generated {} events".format(args.nev))
-    output.close()
+    # every grid point has an independent random stream, and so does every shard of a point,
+    # the events only depend on the seed and the shard size
+    if grid:
+        points = grid_points(args, parts)
+        point_seeds = np.random.SeedSequence(args.seed).spawn(len(points))
+    else:
+        points = [(None, args, parts)]
+        point_seeds = [np.random.SeedSequence(args.seed)]
+    shards = [shard_seeds(ss, args.nev, args.shard_size) for ss in point_seeds]
+
+    if grid_files:
+        tasks = [(sh, args.output.format(**tag), pargs, pparts, 0)
+                 for (tag, pargs, pparts), sh in zip(points, shards)]
+    elif args.split:
+        tasks = [([sh], shard_path(args.output, i), args, parts, 0) for i, sh in enumerate(shards[0])]
+
+    if grid_files or args.split:
+        for task, res in zip(tasks, run_tasks(tasks, args.workers)):
+            if res is None:
+                print("Cannot open file \"{}\"".format(task[1]))
+                sys.exit(2)
+            print("Generated {} events in \"{}\"".format(sum(n for n, _ in task[0]), task[1]))
+        print("Generated {} events in {} files".format(args.nev*len(points), len(tasks)))
+    else:
+        output = WRITERS[args.writer](args.output, args.format)
+        if output.failed():
+            print("Cannot open file \"{}\"".format(args.output))
+            sys.exit(2)
+
+        # all grid points in one output, tagged by the event number
+        if grid:
+            for ipoint, (tag, _, _) in enumerate(points):
+                print("Grid point {}: particle = {}, energy = {} GeV, angle = {} deg".format(
+                      ipoint, tag['particle'], tag['energy'], tag['angle']))
+
+        tasks = [([sh], None, pargs, pparts, ipoint)
+                 for ipoint, ((_, pargs, pparts), shs) in enumerate(zip(points, shards)) for sh in shs]
+        count = 0
+        if args.workers > 1:
+            for task, records in zip(tasks, run_tasks(tasks, args.workers)):
+                output.write_records(records)
+                count += task[0][0][0]
+                print("Generated {} events".format(count), end='\r')
+        else:
+            for [(n, ss)], _, pargs, pparts, ipoint in tasks:
+                write_shard(output, np.random.default_rng(ss), n, pargs, pparts, ipoint)
+                count += n
+                print("Generated {} events".format(count), end='\r')
 
+        print("Generated {} events".format(count))
+        output.close()
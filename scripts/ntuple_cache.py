@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+
+# awkward and uproot are imported where they are used, see plot_reco_endcap.py
+
+DEFAULT_MAX_BYTES = 2*1024**3
+HASH_BLOCK_SIZE = 16*1024**2
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024**2, 'GB': 1024**3, 'TB': 1024**4}
+
+
+def parse_size(value):
+    """
+    Size in bytes from a number of bytes (e.g., 1048576) or a number with a unit (e.g., "2 GB")
+    """
+    value = str(value).strip().upper()
+    for unit in sorted(SIZE_UNITS, key=len, reverse=True):
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)])*SIZE_UNITS[unit])
+    return int(value)
+
+
+def split_object_path(file):
+    """
+    (path, object) of an uproot "path:object" specification
+    """
+    path, _, obj = file.rpartition(':')
+    return (path, obj) if path else (file, 'events')
+
+
+class NtupleCache:
+    """
+    On-disk cache of the few branches an analysis reads from the reconstruction output
+
+    An entry holds the awkward arrays of a list of branches of one tree, as the awkward buffers saved to .npy files, so
+    that they are read back memory-mapped. Entries are keyed by the SHA1 of the source file content, the tree and the
+    branch list, and the least recently used ones are evicted when the cache grows beyond max_bytes.
+    The source file hashes are kept in an index keyed by path, size and mtime, so a file is hashed only once, the index
+    counts towards max_bytes and is evicted with the entries.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(cache_dir, 'entries'), exist_ok=True)
+
+    def source_hash(self, path):
+        stat = os.stat(path)
+        index_key = hashlib.sha1("{}:{}:{}".format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns).encode()).hexdigest()
+        index_file = os.path.join(self.cache_dir, 'sources', index_key)
+        try:
+            with open(index_file) as f:
+                digest = f.read().strip()
+            # the mtime is the last use time of the index file, for the LRU eviction
+            os.utime(index_file)
+            return digest
+        except OSError:
+            # not indexed yet, or evicted by another process
+            pass
+
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                sha1.update(block)
+        digest = sha1.hexdigest()
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        self._write_atomic(index_file, lambda f: f.write(digest.encode()))
+        return digest
+
+    def entry_dir(self, path, tree, branches):
+        key = "{}:{}:{}".format(self.source_hash(path), tree, ",".join(sorted(branches)))
+        return os.path.join(self.cache_dir, 'entries', hashlib.sha1(key.encode()).hexdigest())
+
+    def arrays(self, file, branches):
+        """
+        Awkward array of the branches (those present in the tree) of an uproot "path:tree" file, from the cache if present
+        """
+        path, tree = split_object_path(file)
+        entry = self.entry_dir(path, tree, branches)
+        try:
+            return self.load(entry)
+        except (IOError, OSError, ValueError):
+            # not cached, or evicted by another process
+            pass
+        import uproot as ur
+        with ur.open(path) as f:
+            array = f[tree].arrays(filter_name=branches)
+        self.save(entry, array)
+        try:
+            # memory-mapped before the eviction, the buffers stay readable if the entry is removed later
+            array = self.load(entry)
+        except (IOError, OSError, ValueError):
+            # evicted by another process since it was saved, use the array read from the file
+            pass
+        self.evict(keep=entry)
+        return array
+
+    def save(self, entry, array):
+        import awkward as ak
+        form, length, container = ak.to_buffers(array)
+        tmp = "{}.{}.tmp".format(entry, os.getpid())
+        os.makedirs(tmp, exist_ok=True)
+        buffers = {}
+        for i, (key, buffer) in enumerate(container.items()):
+            buffers[key] = "{}.npy".format(i)
+            np.save(os.path.join(tmp, buffers[key]), np.asarray(buffer))
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'form': form.to_dict(), 'length': length, 'buffers': buffers}, f)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # written concurrently by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def load(self, entry):
+        import awkward as ak
+        meta_file = os.path.join(entry, 'meta.json')
+        with open(meta_file) as f:
+            meta = json.load(f)
+        # the meta.json mtime is the last use time of the entry, for the LRU eviction
+        os.utime(meta_file)
+        container = {key: np.load(os.path.join(entry, name), mmap_mode='r') for key, name in meta['buffers'].items()}
+        return ak.from_buffers(ak.forms.from_dict(meta['form']), meta['length'], container)
+
+    def entries(self):
+        """
+        (last use time, size, path) of each entry
+        """
+        entries = []
+        entries_dir = os.path.join(self.cache_dir, 'entries')
+        for name in os.listdir(entries_dir):
+            entry = os.path.join(entries_dir, name)
+            if name.endswith('.tmp'):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+                entries.append((os.path.getmtime(os.path.join(entry, 'meta.json')), size, entry))
+            except OSError:
+                # incomplete, or evicted by another process
+                continue
+        return entries
+
+    def sources(self):
+        """
+        (last use time, size, path) of each source file hash in the index
+        """
+        sources = []
+        sources_dir = os.path.join(self.cache_dir, 'sources')
+        for name in os.listdir(sources_dir) if os.path.isdir(sources_dir) else []:
+            index_file = os.path.join(sources_dir, name)
+            if name.endswith('.tmp'):
+                continue
+            try:
+                sources.append((os.path.getmtime(index_file), os.path.getsize(index_file), index_file))
+            except OSError:
+                continue
+        return sources
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries and source hashes until the cache size is within max_bytes, except the
+        entry keep (in use)
+        """
+        items = sorted(self.entries() + self.sources())
+        total = sum(size for _, size, _ in items)
+        for _, size, item in items:
+            if total <= self.max_bytes:
+                break
+            if item == keep:
+                continue
+            if os.path.isdir(item):
+                shutil.rmtree(item, ignore_errors=True)
+            else:
+                try:
+                    os.remove(item)
+                except OSError:
+                    pass
+            total -= size
+
+    @staticmethod
+    def _write_atomic(path, write):
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Inspect or trim the reduced ntuple cache of the analysis scripts')
+    parser.add_argument('cache_dir', help='Cache directory.')
+    parser.add_argument('--max-size', dest='max_size', type=parse_size, default=None,
+                        help='Evict the least recently used entries down to this size (e.g., "1 GB").')
+    args = parser.parse_args()
+
+    cache = NtupleCache(args.cache_dir, args.max_size if args.max_size is not None else DEFAULT_MAX_BYTES)
+    if args.max_size is not None:
+        cache.evict()
+    entries = sorted(cache.entries(), reverse=True)
+    for last_use, size, entry in entries:
+        print("{}  {:>10.2f} MB  {}".format(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_use)),
+                                             size/1024./1024., os.path.basename(entry)))
+    sources = cache.sources()
+    print("{} entries, {:.2f} MB, {} source hashes, {:.2f} MB".format(
+        len(entries), sum(size for _, size, _ in entries)/1024./1024.,
+        len(sources), sum(size for _, size, _ in sources)/1024./1024.))
@@ -1,33 +1,135 @@
+import os
+import hashlib
 import argparse
+import multiprocessing
 import numpy as np
-import uproot as ur
-from collections import namedtuple
-from scipy.stats import norm
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.pyplot as plt
+from ntuple_cache import NtupleCache, parse_size, DEFAULT_MAX_BYTES
 
+# uproot, awkward, scipy and matplotlib are imported where they are used, so that --help and
+# the modes that do not need them start fast
 
-def plot_energy(rec_file, out_file, out_dir):
+
+ECAL_EFF_COLLECTIONS = ["EcalEndcapPClusters", "EcalEndcapPMergedClusters"]
+ECAL_EFF_BRANCHES = ["EcalEndcapPClusters.whits", "EcalEndcapPClusters.energy", "EcalEndcapPClusters.eta",
+                     "EcalEndcapPMergedClusters.energy", "EcalEndcapPMergedClusters.eta"]
+NHITS_BINS = np.linspace(0.5, 20.5, 21)
+HCAL_ENERGY_BRANCH = "HcalEndcapPRecHits.energy"
+HCAL_ENERGY_GRID = [(ene, ang) for ene in range(2, 21, 2) for ang in range(5, 36, 5)]
+WSCAN_WEIGHTS = [1, 2, 3, 4]
+
+
+def pyplot():
+    """
+    matplotlib.pyplot with the non-interactive Agg backend
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def iterate_events(files, branches, step_size=None, cache=None):
+    """
+    Read the branches from the files as awkward arrays
+    all at once with uproot.concatenate (in-memory mode), or in chunks of step_size with uproot.iterate (streaming mode)
+    with an NtupleCache, the arrays of each file are memory-mapped from the cache instead
+    """
+    import uproot as ur
+    if cache is not None:
+        for file in files:
+            yield cache.arrays(file, branches)
+    elif step_size is None:
+        yield ur.concatenate(files, branches, library='ak')
+    else:
+        yield from ur.iterate(files, branches, step_size=step_size, library='ak')
+
+
+def flat(events, branch):
+    import awkward as ak
+    return ak.to_numpy(ak.flatten(events[branch]))
+
+
+def energy_sums(files, branch, step_size=None, cache=None):
+    """
+    Per-event energy sums of a hit collection
+    """
+    import awkward as ak
+    sums = [ak.to_numpy(ak.sum(events[branch], axis=1)) for events in iterate_events(files, [branch], step_size, cache)]
+    return np.concatenate(sums)
+
+
+def endcap_energy_sums(rec_file, step_size=None, cache=None):
+    """
+    Per-event ecal and hcal endcap energy sums, events with total energy below 0.1 GeV are dropped
+    """
+    import awkward as ak
     files = [rec_file+":events"]
-    endcap_events = ur.concatenate(files, ["EcalEndcapPHitsReco.energy", "HcalEndcapPHitsReco.energy"], library='np')
+    branches = ["EcalEndcapPHitsReco.energy", "HcalEndcapPHitsReco.energy"]
 
     ecal_list = []
     hcal_list = []
-    num_events = len(endcap_events["EcalEndcapPHitsReco.energy"])
-    for i in range(num_events):
-        ecal_energy = np.sum(endcap_events["EcalEndcapPHitsReco.energy"][i])
-        hcal_energy = np.sum(endcap_events["HcalEndcapPHitsReco.energy"][i])
-        if ecal_energy + hcal_energy > 0.1:
-            ecal_list.append(ecal_energy)
-            hcal_list.append(hcal_energy)
-         
-    w_list = []
-    r_list = []
-    w = 1
-    fig, axs = plt.subplots(2, 2)
-    for ax in axs.flat:
-        energy_list = np.array(ecal_list)/w + np.array(hcal_list)
-        
+    for endcap_events in iterate_events(files, branches, step_size, cache):
+        ecal_energy = ak.to_numpy(ak.sum(endcap_events["EcalEndcapPHitsReco.energy"], axis=1))
+        hcal_energy = ak.to_numpy(ak.sum(endcap_events["HcalEndcapPHitsReco.energy"], axis=1))
+        mask = ecal_energy + hcal_energy > 0.1
+        ecal_list.append(ecal_energy[mask])
+        hcal_list.append(hcal_energy[mask])
+    return np.concatenate(ecal_list), np.concatenate(hcal_list)
+
+
+def weight_scan(ecal_list, hcal_list, weights):
+    """
+    Mean and sigma of the combined energy ecal/w + hcal for all the weights w, in closed form
+    from the means, variances and covariance of the ecal and hcal energies: mu = mu_e/w + mu_h and
+    sigma^2 = var_e/w^2 + 2*cov_eh/w + var_h, the maximum likelihood estimates of a normal distribution as norm.fit
+    """
+    ecal = np.asarray(ecal_list, dtype=np.float64)
+    hcal = np.asarray(hcal_list, dtype=np.float64)
+    ecal_mu = ecal.mean()
+    hcal_mu = hcal.mean()
+    ecal_dev = ecal - ecal_mu
+    hcal_dev = hcal - hcal_mu
+    ecal_var = np.mean(ecal_dev**2)
+    hcal_var = np.mean(hcal_dev**2)
+    cov = np.mean(ecal_dev*hcal_dev)
+
+    inv_w = 1./np.asarray(weights, dtype=np.float64)
+    mu = ecal_mu*inv_w + hcal_mu
+    sigma = np.sqrt(np.maximum(ecal_var*inv_w**2 + 2.*cov*inv_w + hcal_var, 0.))
+    return mu, sigma
+
+
+def write_weight_scan(path, weights, mu, sigma):
+    """
+    sigma/mu vs w table, as csv
+    """
+    with open(path, "w") as f:
+        f.write("w,mu,sigma,sigma_over_mu\n")
+        for w, m, s in zip(weights, mu, sigma):
+            f.write("{:g},{:.6g},{:.6g},{:.6g}\n".format(w, m, s, s/m))
+
+
+def plot_energy(rec_file, out_file, out_dir, step_size=None, cache=None, weights=WSCAN_WEIGHTS, panels=None):
+    """
+    Combined energy ecal/w + hcal for a scan of the weights w
+    the panels (default: the weights if at most 4, otherwise 4 weights across the scan) are rendered with a normal fit,
+    and the sigma/mu vs w of the whole scan is plotted and written to a csv table
+    """
+    from scipy.stats import norm
+    plt = pyplot()
+
+    ecal_list, hcal_list = endcap_energy_sums(rec_file, step_size, cache)
+    weights = list(weights)
+    mu_list, sigma_list = weight_scan(ecal_list, hcal_list, weights)
+    if panels is None:
+        panels = weights if len(weights) <= 4 else [weights[i] for i in np.linspace(0, len(weights) - 1, 4).astype(int)]
+
+    ncols = int(np.ceil(np.sqrt(len(panels))))
+    nrows = int(np.ceil(len(panels)/ncols))
+    fig, axs = plt.subplots(nrows, ncols, squeeze=False)
+    for ax, w in zip(axs.flat, panels):
+        energy_list = ecal_list/w + hcal_list
+
         # best fit of data
         (mu, sigma) = norm.fit(energy_list)
 
@@ -40,31 +142,71 @@ def plot_energy(rec_file, out_file, out_dir):
 
         #plot
         ax.set(xlabel="Energy (GeV)")
-        ax.set_title(r"$w=%d, \mu=%.3f,\ \sigma=%.3f$" % (w, mu, sigma))
-        
-        w_list.append(w)
-        r_list.append(sigma/mu)
-        w += 1
+        ax.set_title(r"$w=%g, \mu=%.3f,\ \sigma=%.3f$" % (w, mu, sigma))
     plt.savefig(out_dir+"/"+out_file)
 
+    w_list = weights
+    r_list = sigma_list/mu_list
+    write_weight_scan(out_dir+"/rw_"+os.path.splitext(out_file)[0]+".csv", weights, mu_list, sigma_list)
+
     plt.clf()
     plt.xlabel("w")
     plt.ylabel(r"$\sigma/\mu$")
     plt.title(r"$\sigma/\mu$ vs w")
     plt.scatter(w_list, r_list)
     plt.savefig(out_dir+"/rw_"+out_file)
+    plt.close('all')
+
+
+def cached_energy_sums(task):
+    """
+    Per-event energy sums of a hit collection in one file
+    with a cache_dir, the sums are saved to and loaded from a .npy file keyed by the file path, mtime and branch
+    """
+    path, branch, step_size, cache_dir, cache = task
+    if cache_dir is None:
+        return energy_sums([path+":events"], branch, step_size, cache)
+
+    stat = os.stat(path)
+    key = "{}:{}:{}:{}".format(os.path.abspath(path), stat.st_mtime_ns, stat.st_size, branch)
+    cache_file = os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest()+".npy")
+    if os.path.exists(cache_file):
+        return np.load(cache_file)
+    sums = energy_sums([path+":events"], branch, step_size, cache)
+    # write then rename, so that a concurrent reader never sees a partial file
+    tmp_file = cache_file+".{}.tmp".format(os.getpid())
+    with open(tmp_file, "wb") as f:
+        np.save(f, sums)
+    os.replace(tmp_file, cache_file)
+    return sums
+
+
+def hcal_energy_sums(rec_file, step_size=None, jobs=1, cache_dir=None, cache=None):
+    """
+    Per-event hcal energy sums of all the (energy, angle) grid points, read in a process pool if jobs > 1
+    """
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    tasks = [(rec_file+str(ene)+"GeV_"+str(ang)+"deg.root", HCAL_ENERGY_BRANCH, step_size, cache_dir, cache)
+             for ene, ang in HCAL_ENERGY_GRID]
+    if jobs > 1:
+        with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+            sums = pool.map(cached_energy_sums, tasks)
+    else:
+        sums = list(map(cached_energy_sums, tasks))
+    return dict(zip(HCAL_ENERGY_GRID, sums))
+
 
+def plot_hcal_energy(rec_file, out_file, out_dir, step_size=None, jobs=1, cache_dir=None, cache=None):
+    plt = pyplot()
+    from matplotlib.backends.backend_pdf import PdfPages
 
-def plot_hcal_energy(rec_file, out_file, out_dir):
+    energy_sums_grid = hcal_energy_sums(rec_file, step_size, jobs, cache_dir, cache)
     with PdfPages(out_dir+"/"+out_file) as pdf:
         for ene in range(2, 21, 2):
             fig, axs = plt.subplots(3, 3, figsize=(30, 20))
             for ang in range(5, 36, 5):
-                events = ur.open(rec_file+str(ene)+"GeV_"+str(ang)+"deg.root:events")
-                energy = events["HcalEndcapPRecHits.energy"].array(library='ak')
-                energy_list = []
-                for i in range(len(energy)):
-                    energy_list.append(np.sum(energy[i]))
+                energy_list = energy_sums_grid[(ene, ang)]
                 ax = axs.flat[int(ang/5-1)]
                 ax.hist(energy_list, bins='auto', density=True)
                 ax.set(xlabel="Energy (GeV)")
@@ -73,80 +215,107 @@ def plot_hcal_energy(rec_file, out_file, out_dir):
             plt.close()
 
 
-def plot_ecal_efficiency(n_file, tru_file, rec_file, out_file, out_dir):
+def fill_ecal_efficiency(hists, events, min_ene, eff_bins):
+    """
+    Accumulate the cluster nhits histogram and the cluster eta histograms above each energy threshold
+    """
+    hists["nhits"] += np.histogram(flat(events, "EcalEndcapPClusters.whits"), bins=NHITS_BINS)[0]
+    for coll in ECAL_EFF_COLLECTIONS:
+        hists[coll] += eta_above_thresholds(flat(events, coll+".energy"), flat(events, coll+".eta"), min_ene, eff_bins)
+
+
+def eta_above_thresholds(energy, eta, min_ene, eff_bins):
+    """
+    Eta histograms of the clusters with energy > min_ene[i] for all the thresholds in one pass
+    a cluster passes the thresholds below its energy, so a histogram over (number of passed thresholds, eta)
+    summed from the highest threshold down gives the histogram above each threshold
+    """
+    nbins = len(eff_bins) - 1
+    npass = np.searchsorted(min_ene, energy, side='left')
+    # same binning as np.histogram, the last bin includes its upper edge
+    ibin = np.searchsorted(eff_bins, eta, side='right') - 1
+    ibin[eta == eff_bins[-1]] = nbins - 1
+    sel = (ibin >= 0) & (ibin < nbins)
+    hist = np.bincount(npass[sel]*nbins + ibin[sel], minlength=(len(min_ene) + 1)*nbins).reshape(-1, nbins)
+    return np.cumsum(hist[:0:-1], axis=0)[::-1]
+
+
+def ecal_efficiency_hists(files, min_ene, eff_bins, step_size=None, cache=None):
+    hists = {"nhits": np.zeros(len(NHITS_BINS) - 1, dtype=np.int64)}
+    for coll in ECAL_EFF_COLLECTIONS:
+        hists[coll] = np.zeros((len(min_ene), len(eff_bins) - 1), dtype=np.int64)
+    for events in iterate_events(files, ECAL_EFF_BRANCHES, step_size, cache):
+        fill_ecal_efficiency(hists, events, min_ene, eff_bins)
+    return hists
+
+
+def file_efficiency_hists(task):
+    file, min_ene, eff_bins, step_size, cache = task
+    return ecal_efficiency_hists([file], min_ene, eff_bins, step_size, cache)
+
+
+def merge_hists(hists_list):
+    return {key: sum(hists[key] for hists in hists_list) for key in hists_list[0]}
+
+
+def efficiency_hists(file_lists, min_ene, eff_bins, step_size=None, jobs=1, cache=None):
+    """
+    Efficiency histograms of each list of files
+    with jobs > 1, the files of all the lists are read in a process pool and the per-file histograms are merged
+    """
+    if jobs <= 1:
+        return [ecal_efficiency_hists(files, min_ene, eff_bins, step_size, cache) for files in file_lists]
+
+    tasks = [(file, min_ene, eff_bins, step_size, cache) for files in file_lists for file in files]
+    with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+        file_hists = pool.map(file_efficiency_hists, tasks)
+    results = []
+    for files in file_lists:
+        results.append(merge_hists(file_hists[:len(files)]))
+        file_hists = file_hists[len(files):]
+    return results
+
+
+def plot_ecal_efficiency(n_file, tru_file, rec_file, out_file, out_dir, step_size=None, jobs=1, cache=None):
+    plt = pyplot()
+
     tru_files = []
     rec_files = []
     for proc in range(int(n_file)):
         tru_files.append(tru_file+str(proc)+".root:events")
         rec_files.append(rec_file+str(proc)+".root:events")
-    tru_events = ur.concatenate(tru_files, ["EcalEndcapPClusters.whits", "EcalEndcapPClusters.energy", "EcalEndcapPClusters.eta",
-                                            "EcalEndcapPMergedClusters.energy", "EcalEndcapPMergedClusters.eta"], library='np')
-    rec_events = ur.concatenate(rec_files, ["EcalEndcapPClusters.whits", "EcalEndcapPClusters.energy", "EcalEndcapPClusters.eta",
-                                            "EcalEndcapPMergedClusters.energy", "EcalEndcapPMergedClusters.eta"], library='np')
 
-    tru_nhits = []
-    for n_trus in tru_events["EcalEndcapPClusters.whits"]:
-        for n_tru in n_trus:
-            tru_nhits.append(n_tru)
+    min_ene = np.arange(0.1, 0.95, 0.1)
+    eff_bins = np.arange(1.05, 3.5, 0.1)
+    eff_center = np.arange(1.1, 3.45, 0.1)
 
-    rec_nhits = []
-    for n_recs in rec_events["EcalEndcapPClusters.whits"]:
-        for n_rec in n_recs:
-            rec_nhits.append(n_rec)
+    tru_hists, rec_hists = efficiency_hists([tru_files, rec_files], min_ene, eff_bins, step_size, jobs, cache)
 
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
-    ax1.hist(tru_nhits, bins=20, range=(0.5, 20.5))
-    ax2.hist(rec_nhits, bins=20, range=(0.5, 20.5))
+    ax1.hist(NHITS_BINS[:-1], bins=NHITS_BINS, weights=tru_hists["nhits"])
+    ax2.hist(NHITS_BINS[:-1], bins=NHITS_BINS, weights=rec_hists["nhits"])
     for ax in [ax1, ax2]:
         ax.set_xlabel("nhits")
     ax1.set_title("Truth clustering")
     ax2.set_title("Island clustering")
     plt.savefig(out_dir+"/n_"+out_file)
 
-    min_ene = np.arange(0.1, 0.95, 0.1)
-    eff_bins = np.arange(1.05, 3.5, 0.1)
-    eff_center = np.arange(1.1, 3.45, 0.1)
-    ene_eta = namedtuple("EneEta", ["energy", "eta"])
-
-    tru_tracks = []
-    for enes, etas in zip(tru_events["EcalEndcapPClusters.energy"], tru_events["EcalEndcapPClusters.eta"]):
-        for ene, eta in zip(enes, etas):
-            tru_tracks.append(ene_eta(ene, eta))
-    tru_hist = np.histogram(tru_tracks, bins=eff_bins)
-
-    rec_tracks = []
-    for enes, etas in zip(rec_events["EcalEndcapPClusters.energy"], rec_events["EcalEndcapPClusters.eta"]):
-        for ene, eta in zip(enes, etas):
-            rec_tracks.append(ene_eta(ene, eta))
-    rec_hist = np.histogram(rec_tracks, bins=eff_bins)
-
-    merged_tru_tracks = []
-    for enes, etas in zip(tru_events["EcalEndcapPMergedClusters.energy"], tru_events["EcalEndcapPMergedClusters.eta"]):
-        for ene, eta in zip(enes, etas):
-            merged_tru_tracks.append(ene_eta(ene, eta))
-
-    merged_rec_tracks = []
-    for enes, etas in zip(rec_events["EcalEndcapPMergedClusters.energy"], rec_events["EcalEndcapPMergedClusters.eta"]):
-        for ene, eta in zip(enes, etas):
-            merged_rec_tracks.append(ene_eta(ene, eta))
-    merged_rec_hist = np.histogram(merged_rec_tracks, bins=eff_bins)
-
     plt.clf()
     fig, axs = plt.subplots(3, 3, figsize=(20, 15))
     for iax in range(9):
-        tru_hist = np.histogram([x.eta for x in tru_tracks if x.energy > min_ene[iax]], bins=eff_bins)
-        rec_hist = np.histogram([x.eta for x in rec_tracks if x.energy > min_ene[iax]], bins=eff_bins)
-        merged_tru_hist = np.histogram([x.eta for x in merged_tru_tracks if x.energy > min_ene[iax]], bins=eff_bins)
-        merged_rec_hist = np.histogram([x.eta for x in merged_rec_tracks if x.energy > min_ene[iax]], bins=eff_bins)
+        tru_hist = tru_hists["EcalEndcapPClusters"][iax]
+        rec_hist = rec_hists["EcalEndcapPClusters"][iax]
+        merged_tru_hist = tru_hists["EcalEndcapPMergedClusters"][iax]
+        merged_rec_hist = rec_hists["EcalEndcapPMergedClusters"][iax]
 
-        eff_list = np.divide(rec_hist[0], tru_hist[0])
-        eff_err = np.multiply(eff_list, np.sqrt(np.divide(1., rec_hist[0]) + np.divide(1., tru_hist[0])))
+        eff_list = np.divide(rec_hist, tru_hist)
+        eff_err = np.multiply(eff_list, np.sqrt(np.divide(1., rec_hist) + np.divide(1., tru_hist)))
 
-        merged_eff_list = np.divide(merged_rec_hist[0], merged_tru_hist[0])
-        merged_eff_err = np.multiply(merged_eff_list, np.sqrt(np.divide(1., merged_rec_hist[0]) + np.divide(1., merged_tru_hist[0])))
+        merged_eff_list = np.divide(merged_rec_hist, merged_tru_hist)
+        merged_eff_err = np.multiply(merged_eff_list, np.sqrt(np.divide(1., merged_rec_hist) + np.divide(1., merged_tru_hist)))
 
-        tru_eff_list = np.divide(merged_tru_hist[0], tru_hist[0])
-        tru_eff_err = np.multiply(tru_eff_list, np.sqrt(np.divide(1., merged_tru_hist[0]) + np.divide(1., tru_hist[0])))
+        tru_eff_list = np.divide(merged_tru_hist, tru_hist)
+        tru_eff_err = np.multiply(tru_eff_list, np.sqrt(np.divide(1., merged_tru_hist) + np.divide(1., tru_hist)))
 
         ax = axs.flat[iax]
         ax.errorbar(eff_center, eff_list, yerr=eff_err, fmt='o', color='black',
@@ -160,7 +329,25 @@ def plot_ecal_efficiency(n_file, tru_file, rec_file, out_file, out_dir):
         ax.set_title(r"$E_{clus}$ > "+f"{min_ene[iax]:.1f} GeV")
         #ax.legend()
     plt.savefig(out_dir+"/"+out_file)
-         
+    plt.close('all')
+
+
+def weights_arg(value):
+    """
+    Comma-separated weights (e.g., 1,2,3,4), or a range start:stop:step with stop included (e.g., 0.5:10:0.1)
+    """
+    if ":" in value:
+        start, stop, step = (float(v) for v in value.split(":"))
+        return [float("%.10g" % w) for w in np.arange(start, stop + step/2, step)]
+    return [float(v) if "." in v else int(v) for v in value.split(",")]
+
+
+def step_size_arg(value):
+    """
+    Number of entries (e.g., 100000), or a memory size (e.g., "100 MB") per chunk
+    """
+    return int(value) if value.isdigit() else value
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -175,13 +362,34 @@ if __name__ == '__main__':
     parser.add_argument('out_file', help='Name of output file.')
     parser.add_argument('-o', dest='out_dir', default='results', help='Output directory.')
     parser.add_argument('-n', dest='n_file', default=1, help='Number of files.')
+    parser.add_argument('--weights', dest='weights', type=weights_arg, default=WSCAN_WEIGHTS,
+                        help='Weights w of the ecal energy scan of --plot_ene, as 1,2,3,4 or start:stop:step.')
+    parser.add_argument('--panels', dest='panels', type=weights_arg, default=None,
+                        help='Weights rendered as energy panels by --plot_ene, default: the weights if at most 4, '
+                             'otherwise 4 across the scan.')
+    parser.add_argument('--step-size', dest='step_size', type=step_size_arg, default=None,
+                        help='Streaming mode, read the files in chunks of entries (e.g., 100000) '
+                             'or of memory size (e.g., "100 MB").')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                        help='Number of processes to read the files in parallel.')
+    parser.add_argument('--cache-dir', dest='cache_dir', default=None,
+                        help='Directory to cache the per-event hcal energy sums of the grid files, '
+                             'keyed by file path and modification time.')
+    parser.add_argument('--ntuple-cache', dest='ntuple_cache', default=None,
+                        help='Directory of the reduced ntuple cache, the branches used by the plots are read from the '
+                             'ROOT files once and memory-mapped from the cache afterwards.')
+    parser.add_argument('--ntuple-cache-size', dest='ntuple_cache_size', type=parse_size, default=DEFAULT_MAX_BYTES,
+                        help='Size cap of the reduced ntuple cache (e.g., "2 GB"), least recently used entries are evicted.')
     args = parser.parse_args()
 
+    cache = NtupleCache(args.ntuple_cache, args.ntuple_cache_size) if args.ntuple_cache else None
+
     if args.plot_ene:
-        plot_energy(args.rec_file, args.out_file, args.out_dir)
+        plot_energy(args.rec_file, args.out_file, args.out_dir, args.step_size, cache, args.weights, args.panels)
 
     if args.plot_hcal_ene:
-        plot_hcal_energy(args.rec_file, args.out_file, args.out_dir)
+        plot_hcal_energy(args.rec_file, args.out_file, args.out_dir, args.step_size, args.jobs, args.cache_dir, cache)
 
     if args.plot_ecal_eff:
-        plot_ecal_efficiency(args.n_file, args.tru_file, args.rec_file, args.out_file, args.out_dir)
+        plot_ecal_efficiency(args.n_file, args.tru_file, args.rec_file, args.out_file, args.out_dir, args.step_size,
+                             args.jobs, cache)
@@ -0,0 +1,60 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gaudi_audit_report import parse_log, split_tag
+
+LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gaudi_audit.log')
+
+
+@pytest.fixture
+def report():
+    unresolved = []
+    with open(LOG) as f:
+        algorithms = {alg['name']: alg for alg in parse_log(f, unresolved)}
+    return algorithms, unresolved
+
+
+def test_split_tag():
+    assert split_tag('ecal_digi:execute') == ('ecal_digi', 'execute')
+    assert split_tag('trk_find_alg:ex...') == ('trk_find_alg', 'execute')
+    assert split_tag('trk_find_alg:in...') == ('trk_find_alg', 'initialize')
+    assert split_tag('ci_ecal_clmerge...') == ('ci_ecal_clmerge', None)
+
+
+def test_chrono_cut_source(report):
+    algorithms, unresolved = report
+    # the source column cuts the tag after the phase separator, the phase is still resolved
+    alg = algorithms['trk_find_alg']
+    assert alg['calls'] == 100
+    assert alg['cpu_total'] == pytest.approx(41.2)
+    assert alg['cpu_mean'] == pytest.approx(0.412)
+    assert alg['cpu_initialize'] == pytest.approx(0.3)
+    assert algorithms['ecal_digi']['cpu_initialize'] == pytest.approx(0.01)
+    # a tag cut within the algorithm name is reported, not attributed
+    assert unresolved == ['ci_ecal_clmerge...']
+    assert not any(name.startswith('ci_ecal_clmerge') for name in algorithms)
+
+
+def test_chrono_wide_source(report):
+    algorithms, _ = report
+    assert algorithms['ci_ecal_clreco']['cpu_total'] == pytest.approx(0.2)
+    assert algorithms['PodioReader']['calls'] == 100
+
+
+def test_ranking(report):
+    algorithms, _ = report
+    with open(LOG) as f:
+        assert [alg['name'] for alg in parse_log(f)][:2] == ['trk_find_alg', 'PodioReader']
+
+
+def test_memstat_counters(report):
+    algorithms, _ = report
+    alg = algorithms['trk_find_alg']
+    # the initialize counter does not override the per-algorithm counter
+    assert alg['mem_calls'] == 100
+    assert alg['mem_delta_total'] == pytest.approx(250.)
+    assert alg['mem_delta_mean'] == pytest.approx(2.5)
+    assert alg['rss_max'] == pytest.approx(1800.)
+    assert algorithms['ecal_digi']['rss_max'] == pytest.approx(1031.)